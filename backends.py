@@ -0,0 +1,153 @@
+"""Lazily loaded conversion backends and cached capability probes.
+
+Importing every converter library up front cost about a second per cold start
+(pandas and pytesseract alone are ~0.5 s each), and the Tesseract version check
+started a subprocess every time the Streamlit script ran. Each ``Conversion``
+now names the libraries it needs; they are imported the first time that
+conversion runs, and the import time is recorded. External tool checks
+(Tesseract, Poppler, pandoc/xelatex) run on first use and are cached for the
+life of the process.
+
+    python backends.py          # cold import cost of every backend + probes
+"""
+import importlib
+import importlib.util
+import json
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from functools import lru_cache
+
+# Backend name -> module that has to be imported to use it
+BACKENDS = {
+    "pandas": "pandas",
+    "openpyxl": "openpyxl",
+    "xlsxwriter": "xlsxwriter",
+    "pypandoc": "pypandoc",
+    "pdf2docx": "pdf2docx",
+    "PyPDF2": "PyPDF2",
+    "reportlab": "reportlab.pdfgen.canvas",
+    "pytesseract": "pytesseract",
+    "docx": "docx",
+    "pdf2image": "pdf2image",
+}
+# pip package names, where they differ from the backend name
+PIP_NAMES = {"docx": "python-docx"}
+
+_loaded = {} # backend name -> import seconds (first import in this process)
+_lock = threading.Lock()
+
+
+class BackendUnavailable(ImportError):
+    """Raised when a backend library is not installed."""
+
+
+def installed(name):
+    """Whether backend ``name`` can be imported, without importing it."""
+    module = BACKENDS.get(name, name)
+    try:
+        return importlib.util.find_spec(module.split(".")[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def load(name):
+    """Import backend ``name`` (once per process) and return the module."""
+    module = BACKENDS.get(name, name)
+    if name in _loaded:
+        return sys.modules[module]
+    with _lock:
+        if name not in _loaded:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                raise BackendUnavailable(
+                    f"{name} is not installed (pip install {PIP_NAMES.get(name, name)}): {e}"
+                ) from e
+            _loaded[name] = time.perf_counter() - start
+    return sys.modules[module]
+
+
+def require(names):
+    """Load every backend in ``names``; raises BackendUnavailable for the first missing one."""
+    for name in names:
+        load(name)
+
+
+def import_report():
+    """``{backend: seconds}`` for the backends imported so far in this process.
+
+    Libraries share dependencies (numpy, PIL, ...), so whichever backend is
+    loaded first pays for those.
+    """
+    return {name: round(seconds, 3) for name, seconds in _loaded.items()}
+
+
+# ---------------- Capability probes (cached per process) ----------------
+@lru_cache(maxsize=None)
+def tesseract_available():
+    """pytesseract is installed and the tesseract binary is on PATH.
+
+    pytesseract itself isn't imported (it pulls in pandas); that happens on the first OCR.
+    """
+    return installed("pytesseract") and shutil.which("tesseract") is not None
+
+
+@lru_cache(maxsize=None)
+def poppler_available():
+    """pdf2image is installed and can find Poppler's command line tools."""
+    return installed("pdf2image") and shutil.which("pdfinfo") is not None and shutil.which("pdftoppm") is not None
+
+
+@lru_cache(maxsize=None)
+def pandoc_available():
+    """pandoc and the xelatex PDF engine used for Word ➜ PDF are both present."""
+    if not installed("pypandoc") or shutil.which("xelatex") is None:
+        return False
+    try:
+        load("pypandoc").get_pandoc_version()
+        return True
+    except Exception:
+        return False
+
+
+PROBES = {"tesseract": tesseract_available, "poppler": poppler_available, "pandoc": pandoc_available}
+
+
+def capabilities(run=True):
+    """Probe results by tool name. With ``run=False`` only probes that already ran are included."""
+    return {
+        tool: probe() for tool, probe in PROBES.items()
+        if run or probe.cache_info().currsize
+    }
+
+
+def cold_import_seconds(name):
+    """Import time of ``name`` in a fresh interpreter, or None if it isn't installed."""
+    code = (
+        "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)"
+    ).format(BACKENDS.get(name, name))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return round(float(result.stdout.strip().splitlines()[-1]), 3)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] not in ("report",):
+        print("Usage: python backends.py [report]", file=sys.stderr)
+        return 2
+    report = {
+        "cold_import_seconds": {name: cold_import_seconds(name) for name in BACKENDS},
+        "capabilities": capabilities(),
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Batch mode for the Image Resizer tab.
+
+Every image (uploaded directly or found inside uploaded zip archives) gets the
+same "By Dimensions" or "By File Size (KB)" settings. Images are processed on a
+process pool and written into a single output zip as each one finishes.
+"""
+import io
+import os
+import time
+import zipfile
+from concurrent.futures import as_completed
+from dataclasses import dataclass, field
+
+from PIL import Image
+
+from imaging import DEFAULT_FILTER, RESAMPLE_FILTERS, compress_to_target, fit_size, open_for_resize, resize_file
+from pools import process_pool
+
+IMAGE_EXTS = ("jpg", "jpeg", "png", "bmp", "tiff", "tif")
+
+
+@dataclass
+class ImageResult:
+    name: str
+    output_name: str = None
+    seconds: float = 0.0
+    input_kb: float = 0.0
+    output_kb: float = 0.0
+    detail: str = ""
+    error: str = None
+
+
+@dataclass
+class BatchSummary:
+    results: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.error is None]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if r.error is not None]
+
+    @property
+    def images_per_sec(self):
+        return len(self.succeeded) / self.seconds if self.seconds else 0.0
+
+
+def iter_images(files):
+    """Yield ``(name, bytes)`` for uploaded images, expanding zip archives.
+
+    ``files`` is an iterable of ``(name, bytes)`` pairs.
+    """
+    for name, data in files:
+        ext = name.rsplit(".", 1)[-1].lower()
+        if ext == "zip":
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    member_ext = info.filename.rsplit(".", 1)[-1].lower()
+                    basename = os.path.basename(info.filename)
+                    if info.is_dir() or member_ext not in IMAGE_EXTS or basename.startswith("."):
+                        continue
+                    yield info.filename, archive.read(info)
+        elif ext in IMAGE_EXTS:
+            yield name, data
+
+
+def process_image(name, data, mode, params):
+    """Worker entry point: resize or compress one image; returns ``(ImageResult, bytes)``."""
+    start = time.perf_counter()
+    result = ImageResult(name, input_kb=len(data) / 1024)
+    try:
+        base = os.path.splitext(name)[0]
+        if mode == "By Dimensions":
+            size = (params["width"], params["height"])
+            if params.get("maintain_ratio", True):
+                with Image.open(io.BytesIO(data)) as header:
+                    size = fit_size(header.size, size)
+            resample = RESAMPLE_FILTERS[params.get("resample", DEFAULT_FILTER)]
+            output, file_ext, _ = resize_file(data, size, resample, tiled=True)
+            result.output_name = f"{base}_resized.{file_ext}"
+            result.detail = f"{size[0]}x{size[1]}"
+        else:
+            image, _ = open_for_resize(io.BytesIO(data))
+            compressed = compress_to_target(image, params["target_kb"], tolerance=params["tolerance"] / 100.0)
+            output = compressed.data
+            result.output_name = f"{base}_compressed.jpg"
+            result.detail = f"q{compressed.quality}, {compressed.width}x{compressed.height}, {compressed.encodes} encodes"
+        result.output_kb = len(output) / 1024
+    except Exception as e:
+        result.error = str(e)
+        output = None
+    result.seconds = time.perf_counter() - start
+    return result, output
+
+
+def _unique(name, used):
+    candidate, n = name, 1
+    while candidate in used:
+        n += 1
+        root, ext = os.path.splitext(name)
+        candidate = f"{root}_{n}{ext}"
+    used.add(candidate)
+    return candidate
+
+
+def resize_batch(images, mode, params, zip_file, workers=None, progress=None):
+    """Process ``images`` (``(name, bytes)`` pairs) into ``zip_file``; returns a BatchSummary.
+
+    ``zip_file`` is a path or writable binary file object. ``progress(done, total,
+    result)`` is called as each image finishes.
+    """
+    images = list(images)
+    summary = BatchSummary()
+    start = time.perf_counter()
+    used = set()
+    with zipfile.ZipFile(zip_file, "w", compression=zipfile.ZIP_STORED) as archive, \
+            process_pool(workers, preload=["batch_resize"]) as pool: # Called from Streamlit's script thread
+        # Images are already compressed, so deflating the zip would only cost time
+        futures = [pool.submit(process_image, name, data, mode, params) for name, data in images]
+        for done, future in enumerate(as_completed(futures), 1):
+            result, output = future.result()
+            if output is not None:
+                result.output_name = _unique(result.output_name, used)
+                archive.writestr(result.output_name, output)
+            summary.results.append(result)
+            if progress:
+                progress(done, len(images), result)
+    summary.seconds = time.perf_counter() - start
+    return summary
@@ -0,0 +1,474 @@
+"""Benchmarks for every conversion and both resize modes, on a synthetic corpus.
+
+The corpus is generated locally from a fixed seed (text and image-only PDFs,
+wide and tall CSVs, nested JSON, a multi-sheet workbook, a Word document,
+large JPEG/PNG/TIFF images and a long text file), so runs are reproducible
+offline. Each case runs in its own interpreter and records wall time, CPU time
+(including worker processes), peak RSS and output size. Results are written as
+JSON; ``compare`` (or ``run --baseline``) fails when a case got slower or
+bigger than a threshold.
+
+    python bench.py run -o bench.json
+    python bench.py run --scale 0.2 --only csv --repeat 3
+    python bench.py run -o new.json --baseline bench.json --threshold 0.25
+    python bench.py compare bench.json new.json
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+from telemetry import peak_rss_mb, reset_peak_rss
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS_DIR = os.path.join(HERE, ".bench")
+# Changes smaller than these never count as regressions (timer and allocator noise)
+MIN_SECONDS_DELTA = 0.05
+MIN_RSS_DELTA_MB = 16
+WORDS = (
+    "invoice total amount customer order shipment payment balance account report quarterly summary "
+    "revenue margin forecast budget region product supplier contract delivery status approved pending"
+).split()
+
+
+# ---------------- Corpus ----------------
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _write_text(path, rng, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            if i % 50 == 0:
+                f.write(f"Section {i // 50 + 1} — Überblick / Обзор / Σύνοψη\n")
+            f.write(_sentence(rng, rng.randint(4, 30)) + "\n")
+
+
+def _write_tall_csv(path, rng, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("id,date,customer,amount,quantity,status\n")
+        for i in range(rows):
+            f.write(f"{i},2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d},{rng.choice(WORDS)} {i % 997},"
+                    f"{rng.uniform(1, 10000):.2f},{rng.randint(1, 500)},{rng.choice(('open', 'paid', 'late'))}\n")
+
+
+def _write_wide_csv(path, rng, rows, columns):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(f"c{j}" for j in range(columns)) + "\n")
+        for _ in range(rows):
+            f.write(",".join(f"{rng.random():.5f}" for _ in range(columns)) + "\n")
+
+
+def _write_nested_json(path, rng, records):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(records):
+            record = {
+                "id": i,
+                "customer": {"name": f"{rng.choice(WORDS)} {i}", "address": {"city": rng.choice(WORDS), "zip": i % 99999}},
+                "items": [rng.randint(1, 9) for _ in range(3)],
+                "total": round(rng.uniform(1, 5000), 2),
+            }
+            if i % 1000 == 999:
+                record["note"] = _sentence(rng) # Late extra column
+            f.write(("," if i else "") + json.dumps(record))
+        f.write("]")
+
+
+def _write_workbook(path, rng, sheets, rows):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Region {s + 1}")
+        ws.append(["id", "product", "units", "price", "total"])
+        for i in range(rows):
+            units, price = rng.randint(1, 100), round(rng.uniform(1, 500), 2)
+            ws.append([i, rng.choice(WORDS), units, price, round(units * price, 2)])
+    wb.save(path)
+
+
+def _write_docx(path, rng, paragraphs):
+    import io
+
+    from docx import Document
+    from docx.shared import Inches
+    from PIL import Image
+
+    doc = Document()
+    doc.add_heading("Quarterly report", 0)
+    for i in range(paragraphs):
+        if i % 40 == 0:
+            doc.add_heading(f"Section {i // 40 + 1}", 1)
+            for _ in range(3):
+                doc.add_paragraph(_sentence(rng), style="List Bullet")
+            table = doc.add_table(rows=6, cols=4)
+            table.style = "Table Grid"
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = rng.choice(WORDS)
+        doc.add_paragraph(" ".join(_sentence(rng) for _ in range(4)))
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 360), (40, 90, 160)).save(buf, "PNG")
+    buf.seek(0)
+    doc.add_picture(buf, width=Inches(4))
+    doc.save(path)
+
+
+def _photo(width, height, seed):
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = np.stack(np.broadcast_arrays(x * 200 + y * 40, y * 180 + 30 + x * 0, (1 - x) * 120 + y * 90), axis=-1)
+    noise = rng.normal(0, 12, (height, width, 1)).astype(np.float32)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+
+def _text_page(rng, size=(1275, 1650), lines=40):
+    """A scanned-looking page (150 DPI letter) of black text on white."""
+    from PIL import Image, ImageDraw
+
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    for i in range(lines):
+        draw.text((100, 100 + i * 36), _sentence(rng, 10), fill=0)
+    return page
+
+
+def make_corpus(directory, scale=1.0, seed=0):
+    """Generate the fixtures into ``directory`` (skipping ones already there); returns ``{name: path}``.
+
+    A ``corpus.json`` records the scale and seed; fixtures built with other
+    values are rebuilt rather than reused.
+    """
+    os.makedirs(directory, exist_ok=True)
+    marker = os.path.join(directory, "corpus.json")
+    params = {"scale": scale, "seed": seed}
+    try:
+        with open(marker, encoding="utf-8") as f:
+            stale = json.load(f) != params
+    except (OSError, ValueError):
+        stale = True
+    n = lambda count: max(1, int(count * scale))
+    builders = {
+        "long.txt": lambda p, rng: _write_text(p, rng, n(100000)),
+        "tall.csv": lambda p, rng: _write_tall_csv(p, rng, n(200000)),
+        "wide.csv": lambda p, rng: _write_wide_csv(p, rng, n(2000), 200),
+        "nested.json": lambda p, rng: _write_nested_json(p, rng, n(50000)),
+        "sheets.xlsx": lambda p, rng: _write_workbook(p, rng, 3, n(50000)),
+        "report.docx": lambda p, rng: _write_docx(p, rng, n(400)),
+        "photo.jpg": lambda p, rng: _photo(n(6000), n(4000), seed).save(p, "JPEG", quality=90),
+        "graphic.png": lambda p, rng: _photo(n(3000), n(2000), seed + 1).save(p, "PNG"),
+        "scan.tif": lambda p, rng: _photo(n(6000), n(5000), seed + 2).save(p, "TIFF", tiffinfo={278: 64}),
+        "text_scan.png": lambda p, rng: _text_page(rng).save(p, "PNG", dpi=(150, 150)),
+        "scanned.pdf": lambda p, rng: _scanned_pdf(p, rng, n(6)),
+    }
+    if stale:
+        for name in [*builders, "text.pdf"]:
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+    paths = {}
+    for name, build in builders.items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            tmp = path + ".tmp" + os.path.splitext(name)[1]
+            build(tmp, random.Random(f"{seed}:{name}"))
+            os.replace(tmp, path)
+        paths[name] = path
+
+    text_pdf_path = os.path.join(directory, "text.pdf")
+    if not os.path.exists(text_pdf_path):
+        # A PDF with a real text layer, drawn by the Text ➜ PDF renderer
+        from text_pdf import render_text_pdf
+
+        source = os.path.join(directory, "text_source.txt")
+        _write_text(source, random.Random(f"{seed}:text.pdf"), n(3000))
+        render_text_pdf(source, text_pdf_path + ".tmp")
+        os.replace(text_pdf_path + ".tmp", text_pdf_path)
+        os.remove(source)
+    paths["text.pdf"] = text_pdf_path
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(params, f)
+    return paths
+
+
+def _scanned_pdf(path, rng, pages):
+    images = [_text_page(rng).convert("RGB") for _ in range(pages)]
+    images[0].save(path, "PDF", save_all=True, append_images=images[1:], resolution=150)
+
+
+# ---------------- Cases ----------------
+@dataclass
+class Case:
+    name: str
+    fixture: str
+    conversion_type: str = None # None for resize cases
+    options: dict = field(default_factory=dict)
+    needs: tuple = () # External tools from backends.PROBES
+
+
+CASES = [
+    Case("pdf_to_text.text_layer", "text.pdf", "PDF ➜ Text"),
+    Case("pdf_to_text.scanned", "scanned.pdf", "PDF ➜ Text", {"ocr_workers": 2}, needs=("tesseract", "poppler")),
+    Case("pdf_to_word.text_layer", "text.pdf", "PDF ➜ Word", {"workers": 1}),
+    Case("pdf_to_word.text_layer_sharded", "text.pdf", "PDF ➜ Word", {"workers": 4}),
+    Case("pdf_to_word.scanned", "scanned.pdf", "PDF ➜ Word", {"ocr_workers": 2}, needs=("tesseract", "poppler")),
+    Case("word_to_pdf.native", "report.docx", "Word ➜ PDF", {"engine": "native"}),
+    Case("word_to_pdf.pandoc", "report.docx", "Word ➜ PDF", {"engine": "pandoc"}, needs=("pandoc",)),
+    Case("csv_to_excel.tall", "tall.csv", "CSV ➜ Excel"),
+    Case("csv_to_excel.wide", "wide.csv", "CSV ➜ Excel"),
+    Case("csv_to_json.tall", "tall.csv", "CSV ➜ JSON"),
+    Case("csv_to_json.tall_ndjson", "tall.csv", "CSV ➜ JSON", {"ndjson": True}),
+    Case("csv_to_json.wide", "wide.csv", "CSV ➜ JSON"),
+    Case("json_to_csv.nested", "nested.json", "JSON ➜ CSV"),
+    Case("excel_to_csv.first_sheet", "sheets.xlsx", "Excel ➜ CSV"),
+    Case("excel_to_csv.all_sheets", "sheets.xlsx", "Excel ➜ CSV (all sheets, zip)"),
+    Case("text_to_pdf.long", "long.txt", "Text ➜ PDF"),
+    Case("image_to_text.page", "text_scan.png", "Image ➜ Text (OCR)", needs=("tesseract",)),
+    Case("image_to_word.page", "text_scan.png", "Image ➜ Word (OCR)", needs=("tesseract",)),
+    Case("resize.dimensions.jpeg", "photo.jpg", options={"mode": "By Dimensions", "width": 1200, "height": 800}),
+    Case("resize.dimensions.png", "graphic.png", options={"mode": "By Dimensions", "width": 1200, "height": 800}),
+    Case("resize.dimensions.tiff_tiled", "scan.tif",
+         # Threshold 0: scan.tif is below TILED_MIN_PIXELS at every scale, but this case times the banded path
+         options={"mode": "By Dimensions", "width": 1200, "height": 1000, "tiled": True, "tiled_min_pixels": 0}),
+    Case("resize.file_size.jpeg", "photo.jpg", options={"mode": "By File Size (KB)", "target_kb": 300}),
+    Case("resize.file_size.png", "graphic.png", options={"mode": "By File Size (KB)", "target_kb": 200}),
+]
+
+
+# Linux reports ru_maxrss in kilobytes, macOS in bytes
+_MAXRSS_UNIT = 1024 * 1024 if sys.platform == "darwin" else 1024
+
+
+def _usage():
+    """CPU seconds (this process and its workers) and peak RSS in MB."""
+    if resource is None:
+        return 0.0, None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    return cpu, max(peak_rss_mb() or 0.0, children.ru_maxrss / _MAXRSS_UNIT)
+
+
+def _run_case(case, corpus_dir, out_dir):
+    """Run one case in this process; returns its measurements."""
+    # Linux carries ru_maxrss across fork+exec, so without a reset a case would
+    # report at least the harness's own peak
+    reset_peak_rss()
+    input_path = os.path.join(corpus_dir, case.fixture)
+    if case.conversion_type is None:
+        from imaging import compress_to_target, open_for_resize, resize_file
+
+        with open(input_path, "rb") as f:
+            data = f.read()
+        cpu0, _ = _usage()
+        start = time.perf_counter()
+        if case.options["mode"] == "By Dimensions":
+            size = (case.options["width"], case.options["height"])
+            tiled = {name: case.options[name] for name in ("tiled", "tiled_min_pixels") if name in case.options}
+            output = resize_file(data, size, **tiled)[0]
+        else:
+            image, _ = open_for_resize(input_path)
+            output = compress_to_target(image, case.options["target_kb"]).data
+        wall = time.perf_counter() - start
+        import_seconds = worker_cpu = 0.0
+        output_bytes = len(output)
+    else:
+        from backends import require
+        from conversions import CONVERSIONS, convert, output_filename
+        from telemetry import Telemetry, recording
+
+        start = time.perf_counter()
+        require(CONVERSIONS[case.conversion_type].backends)
+        import_seconds = time.perf_counter() - start
+        output_path = os.path.join(out_dir, output_filename(case.conversion_type, case.name))
+        cpu0, _ = _usage()
+        start = time.perf_counter()
+        # Pool workers are forked from a fork server, not this process, so they
+        # aren't in RUSAGE_CHILDREN; they report their CPU to the recording instead
+        with recording(Telemetry(case.conversion_type), emit_report=False) as telemetry:
+            convert(case.conversion_type, input_path, output_path, **case.options)
+        wall = time.perf_counter() - start
+        worker_cpu = telemetry.child_cpu
+        output_bytes = os.path.getsize(output_path)
+        os.remove(output_path)
+    cpu1, peak_rss = _usage()
+    return {
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu1 - cpu0 + worker_cpu, 4),
+        "import_seconds": round(import_seconds, 4),
+        "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+        "output_bytes": output_bytes,
+    }
+
+
+def _run_isolated(case, corpus_dir, out_dir):
+    """Run ``case`` in a fresh interpreter so peak RSS and imports aren't shared between cases."""
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "_case", case.name, corpus_dir, out_dir],
+        capture_output=True, text=True, cwd=HERE,
+    )
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        return {"status": "error", "error": error}
+    return dict(json.loads(proc.stdout.strip().splitlines()[-1]), status="ok")
+
+
+def run(cases, corpus_dir, repeat=1, log=print):
+    from backends import capabilities
+
+    available = capabilities()
+    out_dir = os.path.join(corpus_dir, "out")
+    os.makedirs(out_dir, exist_ok=True)
+    results = {}
+    for case in cases:
+        missing = [tool for tool in case.needs if not available.get(tool)]
+        if missing:
+            results[case.name] = {"status": "skipped", "reason": f"missing {', '.join(missing)}"}
+            log(f"⏭ {case.name}: missing {', '.join(missing)}")
+            continue
+        runs = [_run_isolated(case, corpus_dir, out_dir) for _ in range(repeat)]
+        failed = [r for r in runs if r["status"] != "ok"]
+        if failed:
+            results[case.name] = failed[0]
+            log(f"❌ {case.name}: {failed[0]['error']}")
+            continue
+        # Median of each measurement across repeats (a measured value, not an average of two)
+        result = {key: statistics.median_low(r[key] for r in runs) for key in runs[0] if key != "status"}
+        result.update(status="ok", repeat=repeat)
+        results[case.name] = result
+        log(f"✅ {case.name}: {result['wall_seconds']:.3f}s wall, {result['cpu_seconds']:.3f}s CPU, "
+            f"{result['peak_rss_mb']} MB peak, {result['output_bytes']:,} bytes")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=HERE, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold=0.2, names=None, log=print):
+    """Regressions against ``baseline``; returns a list of messages.
+
+    A case regresses when its wall time or peak RSS grew by more than
+    ``threshold``, or when it was ok in the baseline and now failed, was
+    skipped or is missing. ``names`` limits the check to those cases.
+    """
+    regressions = []
+    for key in ("scale", "seed"):
+        if baseline.get("meta", {}).get(key) != current.get("meta", {}).get(key):
+            log(f"⚠ The two runs used different corpus {key}s; the comparison is not meaningful.")
+    for name, before in baseline["results"].items():
+        if before.get("status") != "ok" or (names is not None and name not in names):
+            continue
+        now = current["results"].get(name)
+        if now is None:
+            regressions.append(f"{name}: missing from the new run")
+            continue
+        if now.get("status") != "ok":
+            reason = now.get("error") or now.get("reason") or ""
+            regressions.append(f"{name}: ok ➜ {now.get('status')}" + (f" ({reason})" if reason else ""))
+            continue
+        for key, floor in (("wall_seconds", MIN_SECONDS_DELTA), ("peak_rss_mb", MIN_RSS_DELTA_MB)):
+            old, new = before.get(key), now.get(key)
+            if old is None or new is None:
+                continue
+            if new - old > floor and new > old * (1 + threshold):
+                regressions.append(f"{name}: {key} {old} ➜ {new} (+{(new / old - 1) * 100:.0f}%)")
+    for message in regressions:
+        log(f"📉 {message}")
+    return regressions
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every conversion on a synthetic corpus.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("-o", "--output", help="Write JSON results here.")
+    run_parser.add_argument("--corpus", default=None,
+                            help=f"Corpus folder (default: {DEFAULT_CORPUS_DIR}/corpus-<scale>-<seed>).")
+    run_parser.add_argument("--scale", type=float, default=1.0, help="Fixture size multiplier (default: 1.0).")
+    run_parser.add_argument("--seed", type=int, default=0, help="Corpus random seed (default: 0).")
+    run_parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the median is reported.")
+    run_parser.add_argument("--only", action="append", help="Only cases whose name contains this (repeatable, globs allowed).")
+    run_parser.add_argument("--baseline", help="Compare against this results file and fail on regressions.")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed growth before failing (default: 0.2).")
+    compare_parser = sub.add_parser("compare", help="Compare two results files.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+    case_parser = sub.add_parser("_case") # Internal: one case in a fresh interpreter
+    case_parser.add_argument("name")
+    case_parser.add_argument("corpus")
+    case_parser.add_argument("out_dir")
+    args = parser.parse_args(argv)
+
+    if args.command == "_case":
+        case = next(c for c in CASES if c.name == args.name)
+        print(json.dumps(_run_case(case, args.corpus, args.out_dir)))
+        return 0
+
+    if args.command == "compare":
+        return 1 if compare(_load(args.baseline), _load(args.current), args.threshold) else 0
+
+    cases = CASES
+    if args.only:
+        patterns = [p if any(ch in p for ch in "*?[") else f"*{p}*" for p in args.only]
+        cases = [c for c in CASES if any(fnmatch.fnmatch(c.name, p) for p in patterns)]
+    corpus_dir = args.corpus or os.path.join(DEFAULT_CORPUS_DIR, f"corpus-{args.scale:g}-{args.seed}")
+    start = time.perf_counter()
+    print(f"📦 Building corpus in {corpus_dir}...")
+    make_corpus(corpus_dir, scale=args.scale, seed=args.seed)
+    print(f"📦 Corpus ready in {time.perf_counter() - start:.1f}s")
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale": args.scale,
+            "seed": args.seed,
+        },
+        "results": run(cases, corpus_dir, repeat=args.repeat),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Results written to {args.output}")
+    if args.baseline:
+        names = [case.name for case in cases] if args.only else None
+        regressions = compare(_load(args.baseline), report, args.threshold, names)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) over {args.threshold:.0%}.")
+            return 1
+        print("✅ No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
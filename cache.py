@@ -0,0 +1,200 @@
+"""On-disk, size-bounded LRU cache for conversion results.
+
+Entries are keyed by a hash of the input bytes plus the conversion type and its
+parameters, so re-running the same conversion on the same file (a Streamlit
+rerun, a re-uploaded invoice, a repeated batch) is a file copy instead of OCR or
+pandoc. Recency is tracked with the entry's mtime, which every hit refreshes.
+Callers whose outputs are never modified in place (the job queue) can store and
+restore entries as hard links, so a result is never duplicated on disk.
+
+    python cache.py stats
+    python cache.py clear
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "MIVI_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mivi-converter")
+)
+DEFAULT_MAX_MB = int(os.environ.get("MIVI_CACHE_MAX_MB", "1024"))
+HASH_CHUNK = 1024 * 1024
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"): # Python 3.11+: reads into one reused buffer
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        digest = hashlib.sha256()
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Make ``dst`` a hard link to ``src``, or a copy where linking fails; returns True if linked.
+
+    Only for files nobody rewrites in place: both names share the same data.
+    """
+    tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError: # Different filesystem, or no hard link support
+        shutil.copyfile(src, dst)
+        return False
+    os.replace(tmp, dst)
+    return True
+
+
+def make_key(input_digest, operation, params=None, version=1):
+    """Cache key for running ``operation`` with ``params`` on an input with ``input_digest``.
+
+    Bumping ``version`` when an operation's output changes retires its old entries.
+    """
+    payload = json.dumps([input_digest, operation, version, params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB):
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key[:2], key)
+        return base + ".bin", base + ".json"
+
+    def get(self, key):
+        """Return ``(data_path, meta)`` for ``key`` or None, refreshing its recency."""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(data_path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data_path, meta
+
+    def get_bytes(self, key):
+        entry = self.get(key)
+        if entry is None:
+            return None
+        with open(entry[0], "rb") as f:
+            return f.read(), entry[1]
+
+    def put(self, key, src_path, meta=None, link=False):
+        """Copy (or with ``link=True``, hard-link) ``src_path`` into the cache under ``key``.
+
+        Returns True if the entry was linked rather than copied.
+        """
+        data_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        # Write to temp names then rename, so concurrent workers never see half an entry
+        fd, tmp_data = tempfile.mkstemp(dir=os.path.dirname(data_path))
+        os.close(fd)
+        if link:
+            linked = link_or_copy(src_path, tmp_data)
+        else:
+            shutil.copyfile(src_path, tmp_data)
+            linked = False
+        self._commit(tmp_data, data_path, meta_path, meta)
+        return linked
+
+    def put_bytes(self, key, data, meta=None):
+        data_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        fd, tmp_data = tempfile.mkstemp(dir=os.path.dirname(data_path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self._commit(tmp_data, data_path, meta_path, meta)
+
+    def _commit(self, tmp_data, data_path, meta_path, meta):
+        fd, tmp_meta = tempfile.mkstemp(dir=os.path.dirname(meta_path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta or {}, f, default=str)
+        os.replace(tmp_data, data_path)
+        os.replace(tmp_meta, meta_path)
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".bin"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for victim in (path, path[:-4] + ".json"):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def clear(self):
+        """Remove every entry; returns how many were removed."""
+        removed = len(self._entries())
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        return removed
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "directory": self.directory,
+            "entries": len(entries),
+            "size_mb": round(sum(size for _, size, _ in entries) / (1024 * 1024), 2),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "stats"
+    cache = ResultCache()
+    if command == "clear":
+        print(f"🧹 Removed {cache.clear()} cached results from {cache.directory}")
+    elif command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    else:
+        print("Usage: python cache.py [stats|clear]", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""Headless batch conversion for MIVI Converter.
+
+Examples:
+    python cli.py invoices/ -o out/ --to xlsx
+    python cli.py "scans/**/*.pdf" -o out/ --workers 8
+    python cli.py report.docx notes.txt -o out/
+
+The conversion is picked from the same extension map the Streamlit UI uses.
+When a file type has more than one conversion, the first one is used unless
+``--to`` names the wanted output extension.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache import ResultCache
+from conversions import (
+    CHUNKED_CONVERSIONS,
+    CONVERSIONS,
+    CONVERSIONS_BY_EXT,
+    DEFAULT_CHUNK_ROWS,
+    DEFAULT_DPI,
+    DEFAULT_MAX_MEMORY_MB,
+    OCR_CONVERSIONS,
+    WORD_PDF_ENGINES,
+    available_conversions,
+    cached_convert,
+    convert,
+    file_extension,
+    output_filename,
+)
+from telemetry import Telemetry, recording
+
+# Conversions that accept the page-level OCR options (dpi, memory ceiling, workers)
+OCR_PDF_CONVERSIONS = ("PDF ➜ Text", "PDF ➜ Word")
+
+
+def _glob_root(pattern):
+    """The leading directories of ``pattern`` that contain no wildcards."""
+    parts = []
+    for part in pattern.replace(os.sep, "/").split("/")[:-1]:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return "/".join(parts) or "."
+
+
+def expand_inputs(patterns, recursive=False):
+    """Expand files, directories and glob patterns into a sorted list of ``(path, subdir)``.
+
+    ``subdir`` is the file's folder relative to the directory or glob it was
+    found through ("" for files named directly), so outputs can mirror it.
+    """
+    files = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            walker = os.walk(pattern) if recursive else [(pattern, [], os.listdir(pattern))]
+            for root, _, names in walker:
+                for name in names:
+                    path = os.path.join(root, name)
+                    if os.path.isfile(path) and file_extension(path) in CONVERSIONS_BY_EXT:
+                        files.setdefault(path, os.path.relpath(root, pattern))
+        elif os.path.isfile(pattern):
+            files.setdefault(pattern, "")
+        else:
+            root = _glob_root(pattern)
+            for path in glob.glob(pattern, recursive=True):
+                if os.path.isfile(path):
+                    files.setdefault(path, os.path.relpath(os.path.dirname(path) or ".", root))
+    return sorted((path, "" if subdir == os.curdir else subdir) for path, subdir in files.items())
+
+
+def pick_conversion(path, target_ext=None):
+    """Return the conversion type for ``path``, or None if nothing applies."""
+    for conversion_type in available_conversions(file_extension(path)):
+        if target_ext is None or CONVERSIONS[conversion_type].output_ext == target_ext:
+            return conversion_type
+    return None
+
+
+_cache = None
+
+
+def run_job(conversion_type, input_path, output_path, options, use_cache=True):
+    """Worker entry point: convert one file and report how long it took (stage timings go to telemetry.py)."""
+    global _cache
+    start = time.perf_counter()
+    # A worker runs one file at a time, so its peak RSS is reset and reported per file
+    with recording(Telemetry(conversion_type, input_path, output_path, exclusive=True, source="cli")):
+        if use_cache:
+            if _cache is None:
+                _cache = ResultCache()
+            result = cached_convert(_cache, conversion_type, input_path, output_path, **options)
+        else:
+            result = convert(conversion_type, input_path, output_path, **options)
+    result.pop("text", None) # Don't ship OCR text back across processes
+    return output_path, time.perf_counter() - start, result
+
+
+def build_jobs(files, output_dir, target_ext=None, skip_existing=False, options_by_type=None):
+    """Jobs for ``(path, subdir)`` pairs from ``expand_inputs``.
+
+    Outputs go to ``output_dir/subdir``; inputs that would still land on the
+    same output name (e.g. two files named directly from different folders)
+    get ``_2``, ``_3``... appended instead of overwriting each other.
+    """
+    jobs, skipped, taken = [], [], set()
+    for path, subdir in files:
+        conversion_type = pick_conversion(path, target_ext)
+        if conversion_type is None:
+            skipped.append((path, "no matching conversion"))
+            continue
+        file_base = os.path.splitext(os.path.basename(path))[0]
+        output_path = os.path.join(output_dir, subdir, output_filename(conversion_type, file_base))
+        n = 1
+        while os.path.normcase(output_path) in taken:
+            n += 1
+            output_path = os.path.join(output_dir, subdir, output_filename(conversion_type, f"{file_base}_{n}"))
+        taken.add(os.path.normcase(output_path))
+        if skip_existing and os.path.exists(output_path):
+            skipped.append((path, "output exists"))
+            continue
+        options = dict((options_by_type or {}).get(conversion_type, {}))
+        jobs.append((conversion_type, path, output_path, options))
+    return jobs, skipped
+
+
+def run_batch(jobs, workers=None, use_cache=True, log=print):
+    """Run ``jobs`` on a process pool; returns ``(succeeded, failed)`` lists."""
+    succeeded, failed = [], []
+    if not jobs:
+        return succeeded, failed
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, *job, use_cache=use_cache): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            conversion_type, input_path = futures[future][:2]
+            try:
+                output_path, elapsed, result = future.result()
+            except Exception as e:
+                failed.append((input_path, str(e)))
+                log(f"[{done}/{len(jobs)}] ❌ {input_path} ({conversion_type}): {e}")
+                continue
+            succeeded.append((input_path, output_path, elapsed))
+            detail = " (cached)" if result.get("cached") else ""
+            if result.get("rows_per_sec") and not result.get("cached"):
+                detail += f" [{result['rows']:,} rows, {result['rows_per_sec']:,} rows/s, peak RSS {result['peak_rss_mb']} MB]"
+            log(f"[{done}/{len(jobs)}] ✅ {input_path} ➜ {output_path} ({elapsed:.2f}s){detail}")
+            if result.get("warning"):
+                log(f"    ⚠ {result['warning']}")
+    return succeeded, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch file conversion with MIVI Converter.")
+    parser.add_argument("inputs", nargs="+", help="Files, directories or glob patterns to convert.")
+    parser.add_argument("-o", "--output-dir", default="converted", help="Where to write results (default: ./converted).")
+    parser.add_argument("--to", dest="target_ext", help="Output extension to pick when several conversions apply (e.g. xlsx, json).")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: number of CPUs).")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Descend into sub-directories.")
+    parser.add_argument("--skip-existing", action="store_true", help="Skip files whose output already exists.")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI,
+                        help=f"Rasterization DPI for scanned PDF pages (default: {DEFAULT_DPI}).")
+    parser.add_argument("--ocr-workers", type=int, default=1,
+                        help="OCR processes per scanned PDF (default: 1, since files already run in parallel).")
+    parser.add_argument("--pdf-word-workers", type=int, default=1,
+                        help="pdf2docx processes per PDF ➜ Word file (default: 1, since files already run in parallel).")
+    parser.add_argument("--ocr-memory-mb", type=int, default=DEFAULT_MAX_MEMORY_MB,
+                        help=f"Raster memory ceiling in MB per scanned PDF (default: {DEFAULT_MAX_MEMORY_MB}).")
+    parser.add_argument("--ocr-lang", default="eng", help="Tesseract language(s), e.g. eng or eng+deu (default: eng).")
+    parser.add_argument("--ocr-psm", type=int, default=3, help="Tesseract page segmentation mode (default: 3).")
+    parser.add_argument("--ocr-oem", type=int, default=3, help="Tesseract OCR engine mode (default: 3).")
+    parser.add_argument("--word-engine", choices=WORD_PDF_ENGINES, default="auto",
+                        help="Word ➜ PDF renderer: native (built-in), pandoc (+ xelatex) or auto (default: auto).")
+    parser.add_argument("--ndjson", action="store_true", help="Write CSV ➜ JSON output as NDJSON (one record per line).")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"Rows per chunk for streamed CSV/JSON/Excel conversions (default: {DEFAULT_CHUNK_ROWS}).")
+    parser.add_argument("--no-cache", action="store_true", help="Always convert, bypassing the result cache.")
+    args = parser.parse_args(argv)
+
+    files = expand_inputs(args.inputs, recursive=args.recursive)
+    if not files:
+        print("No input files found.", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    target_ext = args.target_ext.lstrip(".").lower() if args.target_ext else None
+    options_by_type = {}
+    for conversion_type in OCR_PDF_CONVERSIONS:
+        options_by_type[conversion_type] = {
+            "dpi": args.dpi, "ocr_workers": args.ocr_workers, "max_memory_mb": args.ocr_memory_mb
+        }
+    options_by_type["PDF ➜ Word"]["workers"] = args.pdf_word_workers
+    for conversion_type in OCR_CONVERSIONS:
+        options_by_type.setdefault(conversion_type, {})["ocr"] = {
+            "lang": args.ocr_lang, "psm": args.ocr_psm, "oem": args.ocr_oem
+        }
+    for conversion_type in CHUNKED_CONVERSIONS:
+        options_by_type[conversion_type] = {"chunksize": args.chunk_rows}
+    options_by_type["CSV ➜ JSON"]["ndjson"] = args.ndjson
+    options_by_type["Word ➜ PDF"] = {"engine": args.word_engine}
+    jobs, skipped = build_jobs(files, args.output_dir, target_ext, args.skip_existing, options_by_type)
+    for path, reason in skipped:
+        print(f"⏭ Skipping {path}: {reason}")
+    for output_dir in {os.path.dirname(job[2]) for job in jobs}:
+        os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    succeeded, failed = run_batch(jobs, workers=args.workers, use_cache=not args.no_cache)
+    elapsed = time.perf_counter() - start
+    rate = len(succeeded) / elapsed if elapsed else 0.0
+    print(
+        f"Done: {len(succeeded)} converted, {len(failed)} failed, {len(skipped)} skipped "
+        f"in {elapsed:.1f}s ({rate:.1f} files/s)."
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,522 @@
+"""Conversion core shared by the Streamlit UI (converter.py) and the batch CLI (cli.py).
+
+Every converter takes an input path and an output path, writes the result to
+the output path and returns a dict of details for the caller to report.
+Progress is reported through an optional ``progress(percent, message)`` callback.
+
+Converter libraries are imported inside the converters, and each ``Conversion``
+lists them in ``backends`` so ``convert`` can load (and time) them through
+backends.py the first time that conversion runs.
+"""
+import os
+import shutil
+from dataclasses import dataclass
+
+from backends import (
+    BackendUnavailable, installed, pandoc_available, poppler_available, require, tesseract_available,
+)
+from cache import hash_file, link_or_copy, make_key
+from pdf_ocr import DEFAULT_DPI, DEFAULT_MAX_MEMORY_MB
+from streaming import DEFAULT_CHUNK_ROWS
+from telemetry import copied, note, record_ocr, stage
+
+IMAGE_EXTS = ["jpg", "jpeg", "png"]
+# Pages with fewer non-whitespace characters than this in their text layer get OCR'd
+MIN_TEXT_CHARS = 20
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class ConversionError(Exception):
+    """Raised when a conversion cannot produce any output."""
+
+
+def _noop_progress(percent, message=None):
+    pass
+
+
+def _ocr_progress(progress, start, end, label):
+    """Map per-page OCR progress onto the ``start``-``end`` percent range."""
+    def report(done, total):
+        progress(start + int((end - start) * done / total), f"{label} {done}/{total} pages...")
+    return report
+
+
+def ocr_available():
+    """Tesseract is installed (probed once per process)."""
+    return tesseract_available()
+
+
+def pdf_ocr_available():
+    """Scanned PDF pages can be rasterized (pdf2image + Poppler) and OCR'd."""
+    return tesseract_available() and poppler_available()
+
+
+# ---------------- PDF ➜ WORD ----------------
+def pdf_to_word(input_path, output_path, progress=_noop_progress, dpi=DEFAULT_DPI,
+                max_memory_mb=DEFAULT_MAX_MEMORY_MB, ocr_workers=None, ocr=None, workers=None,
+                min_text_chars=MIN_TEXT_CHARS):
+    """Convert with pdf2docx in page shards across ``workers`` processes (default: all CPUs).
+
+    Pages with images but fewer than ``min_text_chars`` text characters, and
+    pages pdf2docx can't parse, are OCR'd on their own when Tesseract and
+    Poppler are installed; otherwise pdf2docx converts them like the rest.
+    """
+    from pdf_word import convert_pdf_docx
+
+    ocr_stats = {}
+    run_ocr = None
+    if pdf_ocr_available():
+        from ocr import OcrSettings
+        from pdf_ocr import ocr_pages
+
+        def run_ocr(pages):
+            progress(60, f"Running OCR on scanned pages {_page_summary(pages)}...")
+            with stage("ocr"):
+                return ocr_pages(
+                    input_path, pages=pages, dpi=dpi, workers=ocr_workers, max_memory_mb=max_memory_mb,
+                    progress=_ocr_progress(progress, 60, 95, "OCR:"), settings=OcrSettings(**(ocr or {})),
+                    stats=ocr_stats,
+                )
+
+    def report(done, total):
+        progress(5 + int(55 * done / total), f"Converting PDF to Word... {done}/{total} pages")
+
+    progress(5, "Converting PDF to Word... please wait.")
+    try:
+        stats = convert_pdf_docx(
+            input_path, output_path, workers=workers, min_text_chars=min_text_chars, ocr=run_ocr, progress=report
+        )
+    except Exception as e:
+        raise ConversionError(f"Could not convert the PDF to Word: {e}")
+
+    warning = None
+    if stats["scanned_pages"] and run_ocr is None:
+        warning = (
+            f"Pages without a text layer ({_page_summary(stats['scanned_pages'])}) were converted as images "
+            "because external OCR tools are not installed."
+        )
+    if stats["failed_pages"]:
+        failed = f"Pages {_page_summary(stats['failed_pages'])} could not be converted and were left out."
+        warning = f"{warning} {failed}" if warning else failed
+    message = f"✅ {stats['pages']} pages converted with formatting preserved"
+    if stats["ocr_pages"]:
+        message += f"; OCR used on pages {_page_summary(stats['ocr_pages'])}"
+    progress(100, message + ".")
+    return dict(stats, ocr=bool(stats["ocr_pages"]), ocr_stats=ocr_stats, warning=warning)
+
+
+# ---------------- WORD ➜ PDF ----------------
+WORD_PDF_ENGINES = ("auto", "native", "pandoc")
+
+
+def _pandoc_word_to_pdf(input_path, output_path):
+    import pypandoc
+
+    if not pandoc_available():
+        raise ConversionError("Word ➜ PDF via pandoc needs pandoc and xelatex, which were not found on this machine.")
+    pypandoc.convert_file(
+        input_path,
+        "pdf",
+        outputfile=output_path,
+        extra_args=["--pdf-engine=xelatex", "--standalone"]
+    )
+
+
+def word_to_pdf(input_path, output_path, progress=_noop_progress, engine="auto"):
+    """Render .docx to PDF with reportlab (``native``) or pandoc + xelatex (``pandoc``).
+
+    ``auto`` renders natively and only hands the file to pandoc (when it is
+    installed) if the document has content the native renderer can't draw or
+    the native render fails.
+    """
+    from docx_pdf import render_docx_pdf
+
+    if engine not in WORD_PDF_ENGINES:
+        raise ConversionError(f"Unknown Word ➜ PDF engine: {engine}")
+    if engine == "pandoc":
+        progress(40, "Converting Word to PDF with pandoc... please wait.")
+        _pandoc_word_to_pdf(input_path, output_path)
+        progress(100, "✅ Word converted to PDF with formatting preserved.")
+        return {"engine": "pandoc"}
+
+    progress(10, "Rendering Word document...")
+    try:
+        stats = render_docx_pdf(input_path, output_path, progress=lambda f: progress(10 + int(85 * f), None))
+    except Exception as e:
+        if engine == "native" or not pandoc_available():
+            raise ConversionError(f"Could not render the Word document: {e}")
+        progress(40, f"⚠ Built-in renderer failed ({e}). Converting with pandoc...")
+        _pandoc_word_to_pdf(input_path, output_path)
+        progress(100, "✅ Word converted to PDF with pandoc.")
+        return {"engine": "pandoc", "warning": f"Built-in renderer failed: {e}"}
+
+    warning = None
+    if stats["unsupported"]:
+        missing = ", ".join(stats["unsupported"])
+        if engine == "auto" and pandoc_available():
+            progress(40, f"Document has {missing}; converting with pandoc for full fidelity...")
+            _pandoc_word_to_pdf(input_path, output_path)
+            progress(100, "✅ Word converted to PDF with pandoc.")
+            return {"engine": "pandoc"}
+        warning = f"This document has {missing}, which the built-in renderer leaves out."
+    if stats["skipped_images"]:
+        skipped = f"{stats['skipped_images']} image(s) in unsupported formats (e.g. EMF/WMF) were left out."
+        warning = f"{warning} {skipped}" if warning else skipped
+    progress(100, f"✅ Word converted to PDF ({stats['pages']} pages).")
+    return dict(stats, engine="native", warning=warning)
+
+
+# ---------------- PDF ➜ TEXT ----------------
+def _page_summary(pages):
+    """Compact page list for messages, e.g. ``1-3, 7``."""
+    ranges, start = [], None
+    for i, page in enumerate(pages):
+        if start is None:
+            start = page
+        if i + 1 == len(pages) or pages[i + 1] != page + 1:
+            ranges.append(str(start) if start == page else f"{start}-{page}")
+            start = None
+    return ", ".join(ranges)
+
+
+def pdf_to_text(input_path, output_path, progress=_noop_progress, dpi=DEFAULT_DPI,
+                max_memory_mb=DEFAULT_MAX_MEMORY_MB, ocr_workers=None, min_text_chars=MIN_TEXT_CHARS, ocr=None):
+    """Extract text page by page, OCR-ing only pages without a usable text layer.
+
+    A page keeps its PyPDF2 text when it has at least ``min_text_chars``
+    non-whitespace characters. ``page_methods`` in the result maps every page
+    number (1-based) to ``"text"``, ``"ocr"`` or ``"empty"``.
+    """
+    from PyPDF2 import PdfReader
+
+    progress(10, "Extracting text from PDF...")
+    page_texts = {}
+    warning = None
+    try:
+        with stage("extract"):
+            reader = PdfReader(input_path)
+            for number, page in enumerate(reader.pages, 1):
+                page_texts[number] = page.extract_text() or ""
+    except Exception as e:
+        warning = f"PyPDF2 failed: {e}. Attempting OCR."
+        page_texts = {}
+
+    page_methods, ocr_stats = {}, {}
+    for number, page_text in page_texts.items():
+        has_text = len("".join(page_text.split())) >= min_text_chars
+        page_methods[number] = "text" if has_text else "ocr"
+    ocr_needed = [number for number, method in page_methods.items() if method == "ocr"]
+
+    if ocr_needed or not page_texts:
+        if not pdf_ocr_available():
+            if not any(page_texts.get(n, "").strip() for n in page_methods):
+                raise ConversionError("No extractable text found, and external OCR tools are not installed.")
+            for number in ocr_needed:
+                page_methods[number] = "text" if page_texts[number].strip() else "empty"
+            warning = (
+                f"Pages without a usable text layer ({_page_summary(ocr_needed)}) were kept as extracted "
+                "because external OCR tools are not installed."
+            )
+        else:
+            from ocr import OcrSettings
+            from pdf_ocr import ocr_pages
+
+            if ocr_needed:
+                progress(20, f"Running OCR on pages {_page_summary(ocr_needed)}...")
+            else:
+                progress(20, "No text found — running OCR...")
+            with stage("ocr"):
+                ocr_texts = ocr_pages(
+                    input_path, pages=ocr_needed or None, dpi=dpi, workers=ocr_workers,
+                    max_memory_mb=max_memory_mb, progress=_ocr_progress(progress, 20, 95, "OCR:"),
+                    settings=OcrSettings(**(ocr or {})), stats=ocr_stats,
+                )
+            for number, page_text in ocr_texts.items():
+                page_texts[number] = page_text
+                page_methods[number] = "ocr"
+
+    text = "".join(page_texts[number] + "\n" for number in sorted(page_texts))
+    if not text.strip():
+        raise ConversionError("No text could be extracted from the PDF.")
+
+    with stage("encode", len(text)), open(output_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+    ocr_pages_used = [n for n in sorted(page_methods) if page_methods[n] == "ocr"]
+    message = "✅ Text extracted successfully."
+    if ocr_pages_used:
+        message += f" OCR used on {len(ocr_pages_used)}/{len(page_methods)} pages ({_page_summary(ocr_pages_used)})."
+    progress(100, message)
+    return {"ocr": bool(ocr_pages_used), "page_methods": page_methods, "ocr_stats": ocr_stats, "warning": warning}
+
+
+# ---------------- CSV ➜ EXCEL ----------------
+def csv_to_excel(input_path, output_path, progress=_noop_progress, chunksize=DEFAULT_CHUNK_ROWS):
+    # Written straight to disk in constant-memory mode; long CSVs spill onto extra sheets
+    import spreadsheets
+
+    def report(rows, sheets):
+        progress(50, f"Converting CSV to Excel... {rows:,} rows on {sheets} sheet(s)")
+
+    stats = spreadsheets.csv_to_excel_stream(input_path, output_path, chunksize=chunksize, progress=report)
+    message = f"✅ CSV converted to Excel successfully ({stats['rows']:,} rows, {stats['rows_per_sec']:,} rows/s"
+    if stats["peak_rss_mb"] is not None:
+        message += f", process peak RSS {stats['peak_rss_mb']} MB"
+    message += ")."
+    if stats["sheets"] > 1:
+        message += f" Split across {stats['sheets']} sheets (Excel's row limit is {spreadsheets.EXCEL_MAX_ROWS:,})."
+    progress(100, message)
+    return stats
+
+
+# ---------------- EXCEL ➜ CSV ----------------
+def excel_sheet_names(input_path):
+    import spreadsheets
+
+    return spreadsheets.sheet_names(input_path)
+
+
+def excel_to_csv(input_path, output_path, progress=_noop_progress, sheet_name=None):
+    import spreadsheets
+
+    progress(10, "Converting Excel to CSV...")
+    sheet_name, rows = spreadsheets.excel_to_csv(input_path, output_path, sheet_name)
+    progress(100, f"✅ Excel sheet '{sheet_name}' converted to CSV successfully.")
+    return {"sheet_name": sheet_name, "rows": rows}
+
+
+def excel_to_csv_zip(input_path, output_path, progress=_noop_progress):
+    import spreadsheets
+
+    def report(done, total, sheet_name):
+        progress(int(100 * done / total), f"Exported sheet '{sheet_name}' ({done}/{total})...")
+
+    counts = spreadsheets.excel_to_csv_zip(input_path, output_path, progress=report)
+    progress(100, f"✅ {len(counts)} Excel sheets converted to CSV successfully.")
+    return {"sheets": counts, "rows": sum(counts.values())}
+
+
+# ---------------- CSV ➜ JSON ----------------
+def csv_to_json(input_path, output_path, progress=_noop_progress, ndjson=False, chunksize=DEFAULT_CHUNK_ROWS):
+    # Streamed in chunks so multi-GB CSVs never sit in memory as one DataFrame
+    from streaming import csv_to_json_stream
+
+    def report(rows, fraction):
+        progress(5 + int(90 * fraction), f"Converting CSV to JSON... {rows:,} rows")
+
+    rows = csv_to_json_stream(input_path, output_path, chunksize=chunksize, ndjson=ndjson, progress=report)
+    progress(100, "✅ CSV converted to JSON successfully.")
+    return {"rows": rows}
+
+
+# ---------------- JSON ➜ CSV ----------------
+def json_to_csv(input_path, output_path, progress=_noop_progress, chunksize=DEFAULT_CHUNK_ROWS):
+    import pandas as pd
+    from streaming import json_to_csv_stream
+
+    def report(rows, fraction):
+        progress(50, f"Converting JSON to CSV... {rows:,} rows")
+
+    warning = None
+    try:
+        rows = json_to_csv_stream(input_path, output_path, batch_size=chunksize, progress=report)
+    except Exception as e:
+        warning = f"Error processing JSON: {e}. Trying simple read."
+        df = pd.read_json(input_path)
+        df.to_csv(output_path, index=False, encoding="utf-8")
+        rows = len(df)
+
+    progress(100, "✅ JSON converted to CSV successfully.")
+    return {"rows": rows, "warning": warning}
+
+
+# ---------------- TXT ➜ PDF ----------------
+def text_to_pdf(input_path, output_path, progress=_noop_progress):
+    from text_pdf import render_text_pdf
+
+    def report(fraction):
+        progress(int(95 * fraction), "Converting text to PDF...")
+
+    stats = render_text_pdf(input_path, output_path, progress=report)
+    progress(100, f"✅ Text converted to PDF successfully ({stats['pages']} pages).")
+    return stats
+
+
+# ---------------- IMAGE ➜ TEXT (OCR) ----------------
+def image_to_text(input_path, output_path, progress=_noop_progress, ocr=None):
+    from PIL import Image
+    from ocr import OcrEngine, OcrSettings
+
+    progress(10, "Extracting text from image (OCR)...")
+    engine = OcrEngine(OcrSettings(**(ocr or {})))
+    with stage("ocr"):
+        text = engine.image_to_string(Image.open(input_path))
+    with stage("encode", len(text)), open(output_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    progress(100, "✅ Text extracted successfully via OCR.")
+    return {"text": text, "ocr_stats": engine.stats()}
+
+
+# ---------------- IMAGE ➜ WORD (OCR) ----------------
+def image_to_word(input_path, output_path, progress=_noop_progress, ocr=None):
+    from docx import Document
+    from PIL import Image
+    from ocr import OcrEngine, OcrSettings
+
+    progress(10, "Converting image to Word (OCR)...")
+    engine = OcrEngine(OcrSettings(**(ocr or {})))
+    with stage("ocr"):
+        text = engine.image_to_string(Image.open(input_path))
+    with stage("encode", len(text)):
+        doc = Document()
+        doc.add_paragraph(text)
+        doc.save(output_path)
+    progress(100, "✅ Image converted to editable Word document.")
+    return {"ocr_stats": engine.stats()}
+
+
+@dataclass
+class Conversion:
+    func: object
+    output_ext: str
+    mime: str
+    label: str
+    suffix: str = "converted"
+    backends: tuple = () # Libraries from backends.BACKENDS this conversion imports
+    version: int = 1 # Part of the cache key; bump when the output for the same input and options changes
+
+
+CONVERSIONS = {
+    "PDF ➜ Word": Conversion(
+        pdf_to_word, "docx", DOCX_MIME, "📥 Download Converted Word File", backends=("pdf2docx", "docx")
+    ),
+    "Word ➜ PDF": Conversion(
+        word_to_pdf, "pdf", "application/pdf", "📥 Download Converted PDF", backends=("docx", "reportlab")
+    ),
+    "PDF ➜ Text": Conversion(pdf_to_text, "txt", "text/plain", "📥 Download Text File", backends=("PyPDF2",)),
+    "CSV ➜ Excel": Conversion(csv_to_excel, "xlsx", XLSX_MIME, "📥 Download Excel File", backends=("pandas", "openpyxl")),
+    "Excel ➜ CSV": Conversion(excel_to_csv, "csv", "text/csv", "📥 Download CSV File", backends=("pandas", "openpyxl")),
+    "Excel ➜ CSV (all sheets, zip)": Conversion(
+        excel_to_csv_zip, "zip", "application/zip", "📥 Download CSV Files (zip)", "sheets_converted",
+        backends=("pandas", "openpyxl"),
+    ),
+    "CSV ➜ JSON": Conversion(csv_to_json, "json", "application/json", "📥 Download JSON File", backends=("pandas",)),
+    "JSON ➜ CSV": Conversion(json_to_csv, "csv", "text/csv", "📥 Download CSV File", backends=("pandas",)),
+    "Text ➜ PDF": Conversion(text_to_pdf, "pdf", "application/pdf", "📥 Download PDF", backends=("reportlab",)),
+    "Image ➜ Text (OCR)": Conversion(
+        image_to_text, "txt", "text/plain", "📥 Download Extracted Text", "ocr", backends=("pytesseract",)
+    ),
+    "Image ➜ Word (OCR)": Conversion(
+        image_to_word, "docx", DOCX_MIME, "📥 Download Word File", "ocr", backends=("pytesseract", "docx")
+    ),
+}
+
+# Conversions offered per input extension, in the order the UI lists them
+CONVERSIONS_BY_EXT = {
+    "pdf": ["PDF ➜ Text", "PDF ➜ Word"],
+    "docx": ["Word ➜ PDF"],
+    "csv": ["CSV ➜ Excel", "CSV ➜ JSON"],
+    "xlsx": ["Excel ➜ CSV", "Excel ➜ CSV (all sheets, zip)"],
+    "json": ["JSON ➜ CSV"],
+    "txt": ["Text ➜ PDF"],
+}
+for _ext in IMAGE_EXTS:
+    CONVERSIONS_BY_EXT[_ext] = ["Image ➜ Text (OCR)", "Image ➜ Word (OCR)"]
+
+# Conversions that take an ``ocr`` dict of OcrSettings fields (lang, psm, oem, ...)
+OCR_CONVERSIONS = ("PDF ➜ Text", "PDF ➜ Word", "Image ➜ Text (OCR)", "Image ➜ Word (OCR)")
+# Conversions that stream their input in ``chunksize``-row chunks
+CHUNKED_CONVERSIONS = ("CSV ➜ JSON", "JSON ➜ CSV", "CSV ➜ Excel")
+
+
+def file_extension(path):
+    return os.path.splitext(path)[1].lstrip(".").lower()
+
+
+def available_conversions(ext):
+    """Conversions that can run here for files with extension ``ext``.
+
+    Only checks that the libraries are installed (nothing is imported); image
+    formats also need Tesseract, which is probed once and then cached.
+    """
+    options = [c for c in CONVERSIONS_BY_EXT.get(ext, []) if all(installed(b) for b in CONVERSIONS[c].backends)]
+    if ext in IMAGE_EXTS and not ocr_available():
+        return []
+    return options
+
+
+def output_filename(conversion_type, file_base, sheet_name=None):
+    conversion = CONVERSIONS[conversion_type]
+    if sheet_name is not None:
+        file_base = f"{file_base}_{sheet_name}"
+    return f"{file_base}_{conversion.suffix}.{conversion.output_ext}"
+
+
+def convert(conversion_type, input_path, output_path, progress=_noop_progress, **options):
+    """Run ``conversion_type`` on ``input_path`` and write the result to ``output_path``.
+
+    The returned dict's ``message`` is the last progress message the converter reported.
+    """
+    if conversion_type not in CONVERSIONS:
+        raise ConversionError(f"Unknown conversion type: {conversion_type}")
+    conversion = CONVERSIONS[conversion_type]
+    if os.path.exists(output_path) and os.stat(output_path).st_nlink > 1:
+        os.remove(output_path) # Hard-linked to a cache entry; writing in place would change that too
+    try:
+        with stage("import"):
+            require(conversion.backends)
+    except BackendUnavailable as e:
+        raise ConversionError(str(e))
+    last = {}
+
+    def report(percent, message=None):
+        if message:
+            last["message"] = message
+        progress(percent, message)
+
+    result = conversion.func(input_path, output_path, progress=report, **options) or {}
+    record_ocr(result.get("ocr_stats"))
+    if "message" in last: # The converter's closing summary, kept for whoever shows the result later
+        result.setdefault("message", last["message"])
+    return result
+
+
+# Options that change how a conversion runs but not what it writes; left out of cache keys
+EXECUTION_OPTIONS = ("workers", "ocr_workers", "max_memory_mb")
+
+
+def cached_convert(cache, conversion_type, input_path, output_path, progress=_noop_progress,
+                   input_digest=None, link=False, **options):
+    """Like ``convert``, but serve repeats of the same input and options from ``cache``.
+
+    The returned dict has ``cached=True`` when the output came from the cache.
+    With ``link=True`` the output and its cache entry share one file (hard
+    link) instead of being copied; only for outputs nothing edits in place.
+    """
+    if conversion_type not in CONVERSIONS:
+        raise ConversionError(f"Unknown conversion type: {conversion_type}")
+    with stage("cache_lookup"):
+        params = {name: value for name, value in options.items() if name not in EXECUTION_OPTIONS}
+        key = make_key(input_digest or hash_file(input_path), conversion_type, params,
+                       CONVERSIONS[conversion_type].version)
+        hit = cache.get(key)
+    if hit is not None:
+        size = os.path.getsize(hit[0])
+        with stage("cache_restore", size):
+            if link:
+                linked = link_or_copy(hit[0], output_path)
+            else:
+                shutil.copyfile(hit[0], output_path)
+                linked = False
+        if not linked:
+            copied(size)
+        note(cached=True)
+        return dict(hit[1], cached=True)
+    result = convert(conversion_type, input_path, output_path, progress=progress, **options)
+    size = os.path.getsize(output_path)
+    with stage("cache_store", size):
+        if not cache.put(key, output_path, result, link=link):
+            copied(size)
+    note(cached=False)
+    return dict(result, cached=False)
@@ -1,33 +1,31 @@
 import streamlit as st
 from PIL import Image
-import pandas as pd
-import json
 import io
-from io import BytesIO
-import tempfile
+import time
 import os
-import shutil
-import platform
-import pypandoc
-from pdf2docx import Converter
-from PyPDF2 import PdfReader
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-import pytesseract
-from docx import Document
-try:
-    from pdf2image import convert_from_path
-    PDF2IMAGE_AVAILABLE = True
-except ImportError:
-    PDF2IMAGE_AVAILABLE = False
-
-
-# Optional: handle tesseract not found errors gracefully
-try:
-    pytesseract.get_tesseract_version()
-    OCR_AVAILABLE = True
-except Exception:
-    OCR_AVAILABLE = False
+from backends import capabilities, import_report
+from batch_resize import iter_images, resize_batch
+from cache import ResultCache, hash_bytes, make_key
+from imaging import (
+    DEFAULT_FILTER, RESAMPLE_FILTERS, RESIZE_VERSION, TILED_MIN_PIXELS, CompressionResult, can_tile,
+    compress_to_target, open_for_resize, resize_file,
+)
+from conversions import (
+    CHUNKED_CONVERSIONS,
+    CONVERSIONS,
+    DEFAULT_CHUNK_ROWS,
+    DEFAULT_DPI,
+    DEFAULT_MAX_MEMORY_MB,
+    IMAGE_EXTS,
+    MIN_TEXT_CHARS,
+    OCR_CONVERSIONS,
+    available_conversions,
+    excel_sheet_names,
+    ocr_available,
+    output_filename,
+    pdf_ocr_available,
+)
+from jobs import DONE, FINISHED, QUEUED, JobQueue
 
 st.set_page_config(page_title="MIVI Universal Converter", page_icon="📂", layout="wide")
 
@@ -38,28 +36,224 @@ st.markdown(
     "Cloud links (Google Drive, Dropbox, OneDrive) are not accepted. "
     "Download them first before uploading here."
 )
+
+
+# ---------------- RESULT CACHE ----------------
+# st.cache_data keeps recent results in this session; ResultCache persists them
+# on disk across sessions and restarts, keyed by input hash + parameters.
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def resize_cached(image_digest, width, height, resample, tiled, _data):
+    cache = get_result_cache()
+    key = make_key(image_digest, "resize", {"size": [width, height], "resample": resample, "tiled": tiled},
+                   RESIZE_VERSION)
+    hit = cache.get_bytes(key)
+    if hit is not None:
+        return hit[0], hit[1]["ext"], hit[1]["mime"]
+    data, file_ext, mime_type = resize_file(_data, (width, height), RESAMPLE_FILTERS[resample], tiled)
+    cache.put_bytes(key, data, {"ext": file_ext, "mime": mime_type})
+    return data, file_ext, mime_type
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def compress_cached(image_digest, target_kb, tolerance, _data):
+    cache = get_result_cache()
+    key = make_key(image_digest, "compress", {"target_kb": target_kb, "tolerance": tolerance})
+    hit = cache.get_bytes(key)
+    if hit is not None:
+        return CompressionResult(hit[0], **hit[1])
+    # Only decode the full image on a cache miss
+    image, _ = open_for_resize(io.BytesIO(_data))
+    result = compress_to_target(image, target_kb, tolerance=tolerance / 100.0)
+    meta = {k: getattr(result, k) for k in ("quality", "scale", "encodes", "width", "height")}
+    cache.put_bytes(key, result.data, meta)
+    return result
+
+
+@st.cache_resource
+def get_job_queue():
+    # One queue per server process; its worker threads outlive script reruns
+    return JobQueue(cache=get_result_cache())
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def sheet_names_cached(input_digest, _file):
+    return excel_sheet_names(_file)
+
+
+def session_job_ids():
+    """This browser's job IDs, kept in the URL too so a refresh or reconnect finds them again."""
+    if "job_ids" not in st.session_state:
+        from_url = st.query_params.get("jobs", "")
+        st.session_state["job_ids"] = [job_id for job_id in from_url.split(",") if job_id]
+    return st.session_state["job_ids"]
+
+
+def upload_digest(uploaded_file):
+    """sha256 of an upload, hashed once per upload instead of on every rerun."""
+    # getvalue() hands back the upload's own bytes (BytesIO is copy-on-write);
+    # getbuffer() would pin the buffer and make every later getvalue() a full copy
+    file_id, digest = st.session_state.get(f"digest_{uploaded_file.name}", (None, None))
+    if file_id != uploaded_file.file_id:
+        digest = hash_bytes(uploaded_file.getvalue())
+        st.session_state[f"digest_{uploaded_file.name}"] = (uploaded_file.file_id, digest)
+    return digest
+
+
+def remember_job(job_id):
+    job_ids = session_job_ids()
+    if job_id in job_ids:
+        job_ids.remove(job_id)
+    job_ids.insert(0, job_id)
+    del job_ids[10:]
+    st.query_params["jobs"] = ",".join(job_ids)
+
+
+def show_job(job):
+    queue = get_job_queue()
+    st.markdown(f"**{job.input_name}** ➜ {job.conversion_type} · job `{job.id}`")
+    if job.status not in FINISHED:
+        st.progress(job.progress, text=job.message or job.status)
+        if job.status == QUEUED and st.button("✖ Cancel", key=f"cancel_{job.id}"):
+            queue.cancel(job.id)
+        return
+    if job.status != DONE:
+        st.error(job.error or job.message)
+        timing_panel(job)
+        return
+
+    result = job.result
+    st.success(f"{job.message} ({job.seconds:.1f}s)")
+    if result.get("cached") and result.get("message"):
+        st.caption(f"When first converted: {result['message']}")
+    if result.get("warning"):
+        st.warning(result["warning"])
+    conversion = CONVERSIONS[job.conversion_type]
+    if not os.path.exists(queue.output_path(job)):
+        st.error("The output file is no longer available.")
+        return
+    # Read from disk only when the button is clicked, not on every rerun of the panel
+    st.download_button(
+        conversion.label, lambda: queue.read_output(job), file_name=job.output_name, mime=conversion.mime,
+        key=f"download_{job.id}",
+    )
+    hours_left = (queue.expires_at(job) - time.time()) / 3600
+    st.caption(f"Kept for about {max(hours_left, 0):.0f} more hours.")
+
+    if "text" in result:
+        st.text_area("Extracted Text:", result["text"], height=300, key=f"text_{job.id}")
+
+    timing_panel(job)
+
+
+# Stages recorded outside the conversion run itself (see jobs.py)
+OUTSIDE_RUN_STAGES = ("upload", "download")
+
+
+def timing_panel(job):
+    report = job.telemetry
+    if not report.get("stages"):
+        return
+    with st.expander("⏱ Timing breakdown"):
+        stages = report["stages"]
+        run_seconds = report.get("seconds", 0.0)
+        # "ocr.*" rows are summed over OCR worker processes, a breakdown of the "ocr" row
+        tracked = sum(e["seconds"] for n, e in stages.items() if "." not in n and n not in OUTSIDE_RUN_STAGES)
+        total = run_seconds + sum(stages[n]["seconds"] for n in OUTSIDE_RUN_STAGES if n in stages)
+        rows = []
+        for name, entry in stages.items():
+            rows.append({
+                "stage": name,
+                "seconds": f"{entry['seconds']:.3f}",
+                "share": f"{100 * entry['seconds'] / total:.0f}%" if total and "." not in name else "",
+                "calls": str(entry["calls"]),
+                "MB": f"{entry['bytes'] / 1e6:.2f}" if entry["bytes"] else "",
+                "RSS growth MB": "" if entry.get("rss_growth_mb") is None else str(entry["rss_growth_mb"]),
+            })
+        if run_seconds - tracked > 0.001:
+            other = run_seconds - tracked
+            rows.append({"stage": "other", "seconds": f"{other:.3f}", "share": f"{100 * other / total:.0f}%",
+                         "calls": "", "MB": "", "RSS growth MB": ""})
+        st.table(rows)
+        parts = [f"{total:.2f} s total"]
+        if report.get("input_bytes") is not None:
+            parts.append(f"{report['input_bytes'] / 1e6:.2f} MB in")
+        if report.get("output_bytes") is not None:
+            parts.append(f"{report['output_bytes'] / 1e6:.2f} MB out")
+        if report.get("cpu_seconds") is not None:
+            parts.append(f"{report['cpu_seconds']:.2f} s CPU")
+        if report.get("peak_rss_mb") is not None:
+            # The app shares one process between jobs, so its peak isn't this job's alone
+            scope = "peak RSS" if report.get("peak_rss_scope") == "run" else "process peak RSS"
+            parts.append(f"{scope} {report['peak_rss_mb']} MB")
+        if "copies" in report:
+            parts.append(f"{report['copies']} full data copies ({report['copied_bytes'] / 1e6:.2f} MB)")
+        if report.get("cached"):
+            parts.append("served from cache")
+        if report.get("ocr_images"):
+            parts.append(f"{report['ocr_images']} OCR images in {report['tesseract_calls']} tesseract run(s)")
+        st.caption(" · ".join(parts))
+
+
+def job_panel(job_ids, was_active):
+    st.subheader("📋 Your conversions")
+    jobs = get_job_queue().jobs(job_ids)
+    for job in jobs:
+        with st.container(border=True):
+            show_job(job)
+    if was_active and all(job.status in FINISHED for job in jobs):
+        st.rerun()
+
+
+with st.sidebar:
+    st.subheader("🗄 Result Cache")
+    cache_stats = get_result_cache().stats()
+    st.caption(
+        f"{cache_stats['entries']} results, {cache_stats['size_mb']} / {cache_stats['max_mb']} MB | "
+        f"hits {cache_stats['hits']}, misses {cache_stats['misses']}, evictions {cache_stats['evictions']}"
+    )
+    if st.button("🧹 Clear Cache", key="clear_cache"):
+        removed = get_result_cache().clear()
+        st.cache_data.clear()
+        st.success(f"Removed {removed} cached results.")
+
+    # Backends are imported on first use, so this fills in as conversions run
+    with st.expander("⚙ Backends"):
+        loaded = import_report()
+        if loaded:
+            st.caption(" | ".join(f"{name} {seconds:.2f}s" for name, seconds in loaded.items()))
+        else:
+            st.caption("No conversion backends loaded yet.")
+        run_probes = st.button("🔍 Check external tools", key="check_tools")
+        for tool, ok in capabilities(run=run_probes).items():
+            st.caption(f"{'✅' if ok else '❌'} {tool}")
+
 tab1, tab2 = st.tabs(["🖼 Image Resizer", "📄 File Converter"])
 with tab1:
     st.subheader("Resize Your Images Easily")
 
-    img_file = st.file_uploader("Upload an image", type=["jpg", "jpeg", "png", "bmp", "tiff"], key="img_upload")
+    img_files = st.file_uploader(
+        "Upload images (or a zip of images)", type=["jpg", "jpeg", "png", "bmp", "tiff", "zip"],
+        accept_multiple_files=True, key="img_upload"
+    )
     resize_mode = st.radio("Resize Mode", ["By Dimensions", "By File Size (KB)"], key="resize_mode")
 
+    # One plain image keeps the single-image preview flow; anything more is a batch
+    img_file = None
+    if len(img_files) == 1 and not img_files[0].name.lower().endswith(".zip"):
+        img_file = img_files[0]
+
     if img_file:
         try:
-            image = Image.open(img_file)
-            image_format = image.format or "PNG" # Store original format
-            
-            # Ensure image is in a saveable mode (like RGB) before processing
-            if image.mode not in ("RGB", "L"):
-                if image.mode == "RGBA":
-                     # Handle transparency
-                     bg = Image.new("RGB", image.size, (255, 255, 255))
-                     bg.paste(image, (0, 0), image)
-                     image = bg
-                else:
-                    image = image.convert("RGB")
-                image_format = "JPEG" # PNGs with transparency converted to JPEG
+            img_data = img_file.getvalue()
+            image_digest = upload_digest(img_file)
+            # Only the header is read here; pixels are decoded when a resize actually runs.
+            # Non-RGB images (e.g. PNGs with transparency) are flattened and saved as JPEG
+            image = Image.open(io.BytesIO(img_data))
 
             # --- Resize by Dimensions ---
             if resize_mode == "By Dimensions":
@@ -75,26 +269,25 @@ with tab1:
                     elif height != image.height:
                          width = int(image.width * (height / float(image.height)))
 
+                resample = st.selectbox(
+                    "Resampling filter", list(RESAMPLE_FILTERS), index=list(RESAMPLE_FILTERS).index(DEFAULT_FILTER),
+                    key="resample_filter"
+                )
+                tiled = False
+                if can_tile(image) and image.width * image.height >= TILED_MIN_PIXELS:
+                    tiled = st.checkbox(
+                        "Tiled processing (decode the TIFF in bands to save memory)", value=True, key="tiled_resize",
+                        help="Except with Nearest, pixels next to band edges can differ slightly from a one-pass resize."
+                    )
 
                 if st.button("Resize Now", key="resize_button"):
-                    resized = image.resize((int(width), int(height)))
-                    buf = io.BytesIO()
-                    
-                    save_format = image_format
-                    if save_format == "JPEG":
-                        resized.save(buf, format="JPEG", quality=95)
-                        mime_type = "image/jpeg"
-                        file_ext = "jpg"
-                    else:
-                        # Revert to PNG if original was not JPEG
-                        resized.save(buf, format="PNG")
-                        mime_type = "image/png"
-                        file_ext = "png"
-                        
+                    data, file_ext, mime_type = resize_cached(image_digest, int(width), int(height), resample, tiled, img_data)
+                    resized = Image.open(io.BytesIO(data))
+
                     st.image(resized, caption="Resized Image", use_column_width=True)
                     st.download_button(
                         "📥 Download Resized Image",
-                        buf.getvalue(),
+                        data,
                         file_name=f"{os.path.splitext(img_file.name)[0]}_resized.{file_ext}",
                         mime=mime_type,
                         key="download_resized"
@@ -104,33 +297,19 @@ with tab1:
             elif resize_mode == "By File Size (KB)":
                 target_kb = st.number_input("Target Size (KB)", min_value=10, max_value=5000, value=200, key="target_kb")
 
+                tolerance = st.slider("Tolerance (%)", min_value=1, max_value=20, value=5, key="target_tolerance")
+
                 if st.button("Compress Now", key="compress_button"):
-                    buf = io.BytesIO()
-                    quality = 95
-                    
-                    # Compression by size really only works well with JPEG
-                    img_for_compress = image
-                    if img_for_compress.mode == "RGBA":
-                        # Create a white background and paste RGBA image on it
-                        bg = Image.new("RGB", img_for_compress.size, (255, 255, 255))
-                        bg.paste(img_for_compress, (0, 0), img_for_compress)
-                        img_for_compress = bg
-                    elif img_for_compress.mode != "RGB":
-                         img_for_compress = img_for_compress.convert("RGB")
-                    
-                    img_for_compress.save(buf, format="JPEG", quality=quality)
-                    size_kb = len(buf.getvalue()) / 1024
-
-                    while size_kb > target_kb and quality > 5:
-                        quality -= 5
-                        buf.truncate(0)
-                        buf.seek(0)
-                        img_for_compress.save(buf, format="JPEG", quality=quality)
-                        size_kb = len(buf.getvalue()) / 1024
-                        if quality <= 5:
-                            break
-
-                    st.success(f"✅ Compressed to ~{int(size_kb)} KB at quality {quality}")
+                    # Predicts a starting quality from a thumbnail, then bisects
+                    # quality (and downscales if needed) on the full image.
+                    result = compress_cached(image_digest, target_kb, tolerance, img_data)
+                    buf = io.BytesIO(result.data)
+                    size_kb = result.size_kb
+
+                    st.success(
+                        f"✅ Compressed to ~{int(size_kb)} KB at quality {result.quality}"
+                        f" ({result.width}x{result.height}, scale {result.scale:.0%}, {result.encodes} encodes)"
+                    )
                     
                     # Display the compressed image
                     buf.seek(0)
@@ -149,6 +328,79 @@ with tab1:
         except Exception as e:
             st.error(f"❌ Error processing image: {e}")
 
+    # --- Batch mode: same settings for every image, processed in parallel ---
+    if img_files and img_file is None:
+        st.info(f"📦 Batch mode: {len(img_files)} uploads. The same settings are applied to every image.")
+        batch_params = {}
+        if resize_mode == "By Dimensions":
+            cols = st.columns(2)
+            batch_params["width"] = int(cols[0].number_input("Width", min_value=1, value=800, key="batch_width"))
+            batch_params["height"] = int(cols[1].number_input("Height", min_value=1, value=800, key="batch_height"))
+            batch_params["maintain_ratio"] = st.checkbox(
+                "Maintain Aspect Ratio (fit inside width × height)", value=True, key="batch_aspect_ratio"
+            )
+            batch_params["resample"] = st.selectbox(
+                "Resampling filter", list(RESAMPLE_FILTERS), index=list(RESAMPLE_FILTERS).index(DEFAULT_FILTER),
+                key="batch_resample_filter"
+            )
+        else:
+            batch_params["target_kb"] = st.number_input(
+                "Target Size (KB)", min_value=10, max_value=5000, value=200, key="batch_target_kb"
+            )
+            batch_params["tolerance"] = st.slider(
+                "Tolerance (%)", min_value=1, max_value=20, value=5, key="batch_tolerance"
+            )
+        batch_workers = 1
+        if (os.cpu_count() or 1) > 1:
+            batch_workers = st.slider(
+                "Parallel workers", min_value=1, max_value=os.cpu_count(), value=os.cpu_count(), key="batch_workers"
+            )
+
+        if st.button("Process All", key="batch_button"):
+            try:
+                images = list(iter_images((f.name, f.getvalue()) for f in img_files))
+                if not images:
+                    st.error("No images found in the upload.")
+                else:
+                    progress = st.progress(0)
+                    status = st.empty()
+
+                    def report(done, total, result):
+                        progress.progress(int(100 * done / total))
+                        mark = "❌" if result.error else "✅"
+                        status.text(f"{mark} {done}/{total}: {result.name} ({result.seconds:.2f}s)")
+
+                    zip_buf = io.BytesIO()
+                    summary = resize_batch(images, resize_mode, batch_params, zip_buf, workers=batch_workers, progress=report)
+
+                    st.success(
+                        f"✅ Processed {len(summary.succeeded)}/{len(images)} images in {summary.seconds:.1f}s "
+                        f"({summary.images_per_sec:.1f} images/s with {batch_workers} workers)"
+                    )
+                    for failed in summary.failed:
+                        st.warning(f"⚠ {failed.name}: {failed.error}")
+                    with st.expander("⏱ Per-image timing"):
+                        st.dataframe(
+                            [
+                                {
+                                    "image": r.name, "output": r.output_name or "", "seconds": round(r.seconds, 3),
+                                    "input KB": round(r.input_kb, 1), "output KB": round(r.output_kb, 1), "detail": r.detail,
+                                }
+                                for r in summary.results
+                            ],
+                            use_container_width=True,
+                        )
+                    suffix = "resized" if resize_mode == "By Dimensions" else "compressed"
+                    st.download_button(
+                        "📥 Download All (zip)",
+                        zip_buf.getvalue(),
+                        file_name=f"images_{suffix}.zip",
+                        mime="application/zip",
+                        key="download_batch"
+                    )
+            except Exception as e:
+                st.error(f"❌ Error processing images: {e}")
+
 # ================================================================
 #  FILE CONVERTER TAB
 # ================================================================
@@ -162,330 +414,96 @@ with tab2:
     if uploaded_file:
         file_ext = uploaded_file.name.split(".")[-1].lower()
         file_base = os.path.splitext(uploaded_file.name)[0]
+        file_digest = upload_digest(uploaded_file)
 
         # Detect available conversions
-        convert_options = []
-        if file_ext == "pdf":
-            # --- MODIFICATION HERE ---
-            # Removed "PDF ➜ Word" as requested, as it requires complex external OCR tools 
-            # (Tesseract and Poppler) that are not installed.
-            convert_options = ["PDF ➜ Text"]
-        elif file_ext == "docx":
-            convert_options = ["Word ➜ PDF"]
-        elif file_ext == "csv":
-            convert_options = ["CSV ➜ Excel", "CSV ➜ JSON"]
-        elif file_ext == "xlsx":
-            convert_options = ["Excel ➜ CSV"]
-        elif file_ext == "json":
-            convert_options = ["JSON ➜ CSV"]
-        elif file_ext == "txt":
-            convert_options = ["Text ➜ PDF"]
-        elif file_ext in ["jpg", "jpeg", "png"]:
-            if OCR_AVAILABLE:
-                convert_options = ["Image ➜ Text (OCR)", "Image ➜ Word (OCR)"]
-            else:
-                st.warning("OCR (Tesseract) not found. Image-to-text conversions are disabled.")
+        convert_options = available_conversions(file_ext)
+        if file_ext in IMAGE_EXTS and not ocr_available():
+            st.warning("OCR (Tesseract) not found. Image-to-text conversions are disabled.")
 
         if not convert_options:
-            if file_ext not in ["jpg", "jpeg", "png"]: # Avoid double error
+            if file_ext not in IMAGE_EXTS: # Avoid double error
                 st.error("Unsupported file type or no available conversions.")
         else:
             conversion_type = st.selectbox("Select conversion type:", convert_options)
 
+            options = {}
+            is_pdf = conversion_type in ("PDF ➜ Text", "PDF ➜ Word")
+            if conversion_type in OCR_CONVERSIONS and (pdf_ocr_available() if is_pdf else ocr_available()):
+                with st.expander("⚙ OCR settings"):
+                    ocr_cols = st.columns(3)
+                    options["ocr"] = {
+                        "lang": ocr_cols[0].text_input("Language(s)", value="eng", key="ocr_lang", help="e.g. eng, deu, eng+fra"),
+                        "psm": ocr_cols[1].number_input("Page segmentation (--psm)", min_value=0, max_value=13, value=3, key="ocr_psm"),
+                        "oem": ocr_cols[2].number_input("Engine mode (--oem)", min_value=0, max_value=3, value=3, key="ocr_oem"),
+                    }
+            if is_pdf and pdf_ocr_available():
+                with st.expander("⚙ Scanned page settings"):
+                    options["dpi"] = st.number_input("OCR DPI", min_value=72, max_value=600, value=DEFAULT_DPI, step=50, key="ocr_dpi")
+                    options["max_memory_mb"] = st.number_input(
+                        "OCR memory limit (MB)", min_value=128, max_value=16384, value=DEFAULT_MAX_MEMORY_MB, step=128, key="ocr_memory"
+                    )
+                    options["min_text_chars"] = st.number_input(
+                        "OCR pages with fewer text characters than", min_value=0, max_value=1000, value=MIN_TEXT_CHARS, key="ocr_min_chars"
+                    )
+
+            if conversion_type == "PDF ➜ Word":
+                options["workers"] = st.number_input(
+                    "Parallel workers", min_value=1, max_value=64, value=os.cpu_count() or 1, key="pdf_word_workers",
+                    help="Pages are split into shards and converted in this many processes.",
+                )
+
+            if conversion_type in CHUNKED_CONVERSIONS:
+                options["chunksize"] = st.number_input(
+                    "Rows per chunk", min_value=1000, max_value=1000000, value=DEFAULT_CHUNK_ROWS, step=10000,
+                    key="chunk_rows", help="Rows held in memory at a time; larger chunks are faster but use more memory.",
+                )
+
+            if conversion_type == "CSV ➜ JSON":
+                options["ndjson"] = st.checkbox(
+                    "Write NDJSON (one record per line, best for very large files)", value=False, key="ndjson"
+                )
+
+            if conversion_type == "Word ➜ PDF":
+                engine_labels = {
+                    "auto": "Automatic (built-in, pandoc for text boxes/equations)",
+                    "native": "Built-in (fast)",
+                    "pandoc": "Pandoc + XeLaTeX (highest fidelity, slow)",
+                }
+                options["engine"] = st.selectbox(
+                    "Rendering engine", list(engine_labels), format_func=engine_labels.get, key="word_engine"
+                )
+
+            if conversion_type == "Excel ➜ CSV":
+                # Choose the sheet before converting, so picking one doesn't re-run a conversion
+                sheet_names = sheet_names_cached(file_digest, uploaded_file)
+                options["sheet_name"] = sheet_names[0]
+                if len(sheet_names) > 1:
+                    options["sheet_name"] = st.selectbox("Select Excel sheet to convert:", sheet_names)
+
             if st.button("🚀 Convert Now"):
-                progress = st.progress(0)
-                status = st.empty()
-                tmp_dir = tempfile.mkdtemp()
-                
-                try:
-                    # ---------------- PDF ➜ WORD (This block is now unused) ----------------
-                    if conversion_type == "PDF ➜ Word":
-                        status.text("Converting PDF to Word... please wait.")
-                        pdf_path = os.path.join(tmp_dir, "input.pdf")
-                        docx_path = os.path.join(tmp_dir, "output.docx")
-
-                        with open(pdf_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-
-                        progress.progress(10)
-                        cv = None # Initialize converter object
-                        try:
-                            cv = Converter(pdf_path)
-                            cv.convert(docx_path, start=0, end=None)
-                            progress.progress(100)
-                            status.text("✅ Conversion complete with formatting preserved!")
-
-                            with open(docx_path, "rb") as f:
-                                st.download_button(
-                                    "📥 Download Converted Word File",
-                                    f,
-                                    file_name=f"{file_base}_converted.docx",
-                                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                                    key="dl_word_std"
-                                )
-
-                        except Exception as e:
-                            if OCR_AVAILABLE and PDF2IMAGE_AVAILABLE:
-                                status.text(f"⚠ Standard conversion failed. Switching to OCR mode...")
-                                
-                                images = convert_from_path(pdf_path)
-                                doc = Document()
-                                for i, img in enumerate(images):
-                                    status.text(f"Processing page {i+1}/{len(images)} via OCR...")
-                                    text = pytesseract.image_to_string(img)
-                                    doc.add_paragraph(text)
-                                    if i < len(images) - 1:
-                                        doc.add_page_break()
-
-                                doc.save(docx_path)
-                                progress.progress(100)
-                                status.text("✅ OCR conversion completed successfully (scanned PDF handled).")
-                                
-                                with open(docx_path, "rb") as f:
-                                    st.download_button(
-                                        "📥 Download Converted Word File (OCR)",
-                                        f,
-                                        file_name=f"{file_base}_ocr_converted.docx",
-                                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                                        key="dl_word_ocr"
-                                    )
-                            else:
-                                st.error(f"Standard conversion failed: {e}. OCR fallback is unavailable (missing Tesseract or pdf2image).")
-                                
-                        finally:
-                            if cv is not None:
-                                cv.close()
-
-                    # ---------------- WORD ➜ PDF ----------------
-                    elif conversion_type == "Word ➜ PDF":
-                        status.text("Converting Word to PDF... please wait.")
-                        docx_path = os.path.join(tmp_dir, "input.docx")
-                        pdf_output = os.path.join(tmp_dir, f"{file_base}_converted.pdf")
-
-                        with open(docx_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-
-                        progress.progress(40)
-
-                        try:
-                            pypandoc.convert_file(
-                                docx_path,
-                                "pdf",
-                                outputfile=pdf_output,
-                                extra_args=["--pdf-engine=xelatex", "--standalone"]
-                            )
-                            progress.progress(100)
-                            with open(pdf_output, "rb") as f:
-                                st.download_button(
-                                    "📥 Download Converted PDF",
-                                    f,
-                                    file_name=f"{file_base}_converted.pdf",
-                                    mime="application/pdf",
-                                )
-                            status.text("✅ Word converted to PDF with formatting preserved.")
-                        except Exception as e:
-                            st.error(f"❌ Conversion failed: {e}")
-
-
-
-                    # ---------------- PDF ➜ TEXT ----------------
-                    elif conversion_type == "PDF ➜ Text":
-                        status.text("Extracting text from PDF...")
-                        pdf_path = os.path.join(tmp_dir, "input.pdf")
-                        text_output_path = os.path.join(tmp_dir, "output.txt")
-                        text = ""
-
-                        with open(pdf_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-
-                        try:
-                            reader = PdfReader(pdf_path)
-                            for page in reader.pages:
-                                text += (page.extract_text() or "") + "\n"
-                        except Exception as e:
-                            st.warning(f"PyPDF2 failed: {e}. Attempting OCR.")
-                            text = ""
-
-                        if not text.strip() and OCR_AVAILABLE and PDF2IMAGE_AVAILABLE:
-                            status.text("No text found — running OCR...")
-                            pages = convert_from_path(pdf_path)
-                            text = "\n\n--- Page Break ---\n\n".join(pytesseract.image_to_string(p) for p in pages)
-                        elif not text.strip() and (not OCR_AVAILABLE or not PDF2IMAGE_AVAILABLE):
-                             status.error("No extractable text found, and external OCR tools are not installed.")
-                             
-                        if text.strip():
-                            with open(text_output_path, "w", encoding="utf-8") as f:
-                                f.write(text)
-                                
-                            with open(text_output_path, "rb") as f:
-                                st.download_button(
-                                    "📥 Download Text File",
-                                    f,
-                                    file_name=f"{file_base}_converted.txt",
-                                )
-                            status.text("✅ Text extracted successfully.")
-
-                    # ---------------- CSV ➜ EXCEL ----------------
-                    elif conversion_type == "CSV ➜ Excel":
-                        df = pd.read_csv(uploaded_file)
-                        buf = BytesIO()
-                        df.to_excel(buf, index=False)
-                        st.download_button(
-                            "📥 Download Excel File",
-                            buf.getvalue(),
-                            file_name=f"{file_base}_converted.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        )
-                        status.text("✅ CSV converted to Excel successfully.")
-
-                    # ---------------- EXCEL ➜ CSV ----------------
-                    elif conversion_type == "Excel ➜ CSV":
-                        xls = pd.ExcelFile(uploaded_file)
-                        sheet_name = xls.sheet_names[0]
-                        if len(xls.sheet_names) > 1:
-                            sheet_name = st.selectbox("Select Excel sheet to convert:", xls.sheet_names)
-                            
-                        df = pd.read_excel(uploaded_file, sheet_name=sheet_name)
-                        csv_data = df.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            "📥 Download CSV File",
-                            csv_data,
-                            file_name=f"{file_base}_{sheet_name}_converted.csv",
-                            mime="text/csv",
-                        )
-                        status.text(f"✅ Excel sheet '{sheet_name}' converted to CSV successfully.")
-
-                    # ---------------- CSV ➜ JSON ----------------
-                    elif conversion_type == "CSV ➜ JSON":
-                        df = pd.read_csv(uploaded_file)
-                        json_data = df.to_json(orient="records", indent=2)
-                        st.download_button(
-                            "📥 Download JSON File",
-                            json_data.encode("utf-8"),
-                            file_name=f"{file_base}_converted.json",
-                            mime="application/json",
-                        )
-                        status.text("✅ CSV converted to JSON successfully.")
-
-                    # ---------------- JSON ➜ CSV ----------------
-                    elif conversion_type == "JSON ➜ CSV":
-                        try:
-                            data = json.load(uploaded_file)
-                            df = pd.json_normalize(data) # Handles nested JSON
-                        except Exception as e:
-                             status.error(f"Error processing JSON: {e}. Trying simple read.")
-                             uploaded_file.seek(0)
-                             df = pd.read_json(uploaded_file)
-                             
-                        csv_data = df.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            "📥 Download CSV File",
-                            csv_data,
-                            file_name=f"{file_base}_converted.csv",
-                            mime="text/csv",
-                        )
-                        status.text("✅ JSON converted to CSV successfully.")
-
-                    # ---------------- TXT ➜ PDF ----------------
-                    elif conversion_type == "Text ➜ PDF":
-                        text_data = uploaded_file.read().decode("utf-8")
-                        pdf_buf = BytesIO()
-                        c = canvas.Canvas(pdf_buf, pagesize=A4)
-                        width, height = A4 # Get page dimensions
-                        
-                        text_object = c.beginText(40, height - 40) # Start near top-left
-                        c.setFont("Helvetica", 10) # Set font
-                        
-                        line_height = 12 # 12 points per line
-                        max_lines_per_page = (height - 80) // line_height
-                        lines = text_data.splitlines()
-                        
-                        line_count = 0
-                        for line in lines:
-                            # Simple word wrap
-                            if c.stringWidth(line) > (width - 80):
-                                words = line.split()
-                                current_line = ""
-                                for word in words:
-                                    if c.stringWidth(current_line + word + " ") < (width - 80):
-                                        current_line += word + " "
-                                    else:
-                                        text_object.textLine(current_line)
-                                        current_line = word + " "
-                                        line_count += 1
-                                        if line_count >= max_lines_per_page:
-                                            c.drawText(text_object)
-                                            c.showPage()
-                                            c.setFont("Helvetica", 10)
-                                            text_object = c.beginText(40, height - 40)
-                                            line_count = 0
-                                text_object.textLine(current_line) # Add the last part
-                            else:
-                                text_object.textLine(line)
-                            
-                            line_count += 1
-                            if line_count >= max_lines_per_page:
-                                c.drawText(text_object)
-                                c.showPage() # New page
-                                c.setFont("Helvetica", 10)
-                                text_object = c.beginText(40, height - 40)
-                                line_count = 0
-                                
-                        c.drawText(text_object) # Draw remaining text
-                        c.save()
-
-                        st.download_button(
-                            "📥 Download PDF",
-                            pdf_buf.getvalue(),
-                            file_name=f"{file_base}_converted.pdf",
-                            mime="application/pdf",
-                        )
-                        status.text("✅ Text converted to PDF successfully.")
-
-                    # ---------------- IMAGE ➜ TEXT (OCR) ----------------
-                    elif conversion_type == "Image ➜ Text (OCR)":
-                        img = Image.open(uploaded_file)
-                        status.text("Extracting text from image (OCR)...")
-                        text = pytesseract.image_to_string(img)
-                        st.download_button(
-                            "📥 Download Extracted Text",
-                            text.encode("utf-8"),
-                            file_name=f"{file_base}_ocr.txt",
-                            mime="text/plain",
-                        )
-                        status.text("✅ Text extracted successfully via OCR.")
-                        st.text_area("Extracted Text:", text, height=300)
-
-                    # ---------------- IMAGE ➜ WORD (OCR) ----------------
-                    elif conversion_type == "Image ➜ Word (OCR)":
-                        img = Image.open(uploaded_file)
-                        status.text("Converting image to Word (OCR)...")
-                        text = pytesseract.image_to_string(img)
-                        
-                        doc = Document()
-                        doc.add_paragraph(text)
-                        buf = BytesIO()
-                        doc.save(buf)
-                        buf.seek(0)
-                        
-                        st.download_button(
-                            "📥 Download Word File",
-                            buf.getvalue(),
-                            file_name=f"{file_base}_ocr.docx",
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                        )
-                        status.text("✅ Image converted to editable Word document.")
-
-                except Exception as e:
-                    st.error(f"❌ An error occurred during conversion: {e}")
-                
-                finally:
-                    # --- Clean up the temporary directory ---
-                    if os.path.exists(tmp_dir):
-                        try:
-                            shutil.rmtree(tmp_dir)
-                        except Exception as e:
-                            st.warning(f"Could not clean up temp folder: {e}. It will be removed on next run.")
+                output_name = output_filename(conversion_type, file_base, options.get("sheet_name"))
+                job_id = get_job_queue().submit(
+                    conversion_type, uploaded_file.name, output_name, options,
+                    data=uploaded_file.getvalue(), input_digest=file_digest,
+                )
+                remember_job(job_id)
+                st.toast(f"🚀 Conversion started (job {job_id}).")
+
+    # --- Jobs: conversions run in the background and survive reruns and reconnects ---
+    with st.expander("🔎 Fetch an earlier job by ID"):
+        lookup = st.text_input("Job ID", key="job_lookup").strip()
+        if lookup:
+            if get_job_queue().get(lookup):
+                remember_job(lookup)
+            else:
+                st.error("No job with that ID (finished jobs are removed after a while).")
+
+    job_ids = session_job_ids()
+    if job_ids:
+        active = any(job.status not in FINISHED for job in get_job_queue().jobs(job_ids))
+        # Poll while something is running; a finished job triggers one full rerun to stop polling
+        st.fragment(run_every=1.0 if active else None)(job_panel)(job_ids, active)
 
 
 st.markdown("---")
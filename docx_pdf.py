@@ -0,0 +1,448 @@
+"""Word ➜ PDF without pandoc.
+
+The python-docx ``Document`` is walked in body order (paragraphs, tables and
+inline images, including those inside content controls and tracked insertions)
+and turned into reportlab platypus flowables, so a typical memo
+renders in well under a second with no external process and no TeX install.
+Paragraphs that Helvetica can't encode use the DejaVuSans font from text_pdf.py.
+Things this renderer can't draw (text boxes, equations, charts, SmartArt,
+multi-column sections) are reported by ``unsupported_features`` so the caller
+can hand those documents to pandoc instead.
+"""
+import io
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.table import Table as DocxTable
+from docx.text.paragraph import Paragraph as DocxParagraph
+from docx.text.run import Run as DocxRun
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase.pdfmetrics import registerFontFamily
+from reportlab.platypus import Image, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from telemetry import stage
+from text_pdf import LATIN_FONT, UNICODE_FONT, register_unicode_font
+
+DEFAULT_FONT_SIZE = 11
+LINE_SPACING = 1.2
+EMU_PER_POINT = 12700
+HEADING_SIZES = {"Title": 24, "Subtitle": 15, "Heading 1": 18, "Heading 2": 15, "Heading 3": 13}
+ALIGNMENTS = {
+    WD_ALIGN_PARAGRAPH.LEFT: TA_LEFT,
+    WD_ALIGN_PARAGRAPH.CENTER: TA_CENTER,
+    WD_ALIGN_PARAGRAPH.RIGHT: TA_RIGHT,
+    WD_ALIGN_PARAGRAPH.JUSTIFY: TA_JUSTIFY,
+}
+# Content the native renderer would drop, by a readable name -> element tag
+_MATH = "{http://schemas.openxmlformats.org/officeDocument/2006/math}"
+_DRAWINGML = "{http://schemas.openxmlformats.org/drawingml/2006/"
+UNSUPPORTED = {
+    "text boxes": qn("w:txbxContent"),
+    "equations": _MATH + "oMath",
+    "charts": _DRAWINGML + "chart}chart",
+    "SmartArt": _DRAWINGML + "diagram}relIds",
+}
+# Inline wrappers whose runs are drawn like the paragraph's own (tracked insertions, moves, smart tags)
+_RUN_CONTAINERS = (qn("w:ins"), qn("w:moveTo"), qn("w:smartTag"))
+_unicode_family = False
+
+
+def unsupported_features(document):
+    """Names of content in ``document`` that ``render_docx_pdf`` can't draw."""
+    body = document.element.body
+    found = [name for name, tag in UNSUPPORTED.items() if next(body.iter(tag), None) is not None]
+    for cols in body.iter(qn("w:cols")):
+        if int(cols.get(qn("w:num"), "1")) > 1:
+            found.append("multi-column sections")
+            break
+    return found
+
+
+def _font_for(text, unicode_available):
+    if unicode_available and not text.isascii():
+        try:
+            text.encode("cp1252") # Helvetica's WinAnsi encoding
+        except UnicodeEncodeError:
+            return UNICODE_FONT
+    return LATIN_FONT
+
+
+def _style_value(style, attribute):
+    """First ``attribute`` set on ``style.font`` or one of its base styles."""
+    while style is not None:
+        value = getattr(style.font, attribute)
+        if value is not None:
+            return value
+        style = style.base_style
+    return None
+
+
+class _Numbering:
+    """Resolves list labels (``1.``, ``a)``, ``•``) for numbered paragraphs."""
+
+    def __init__(self, document):
+        self.levels = {}
+        self.counters = {}
+        try:
+            numbering = document.part.numbering_part.element
+        except (KeyError, NotImplementedError):
+            return
+        abstract = {a.get(qn("w:abstractNumId")): a for a in numbering.findall(qn("w:abstractNum"))}
+        for num in numbering.findall(qn("w:num")):
+            ref = num.find(qn("w:abstractNumId"))
+            definition = abstract.get(ref.get(qn("w:val"))) if ref is not None else None
+            if definition is None:
+                continue
+            for lvl in definition.findall(qn("w:lvl")):
+                fmt = lvl.find(qn("w:numFmt"))
+                text = lvl.find(qn("w:lvlText"))
+                self.levels[(num.get(qn("w:numId")), lvl.get(qn("w:ilvl")))] = (
+                    fmt.get(qn("w:val")) if fmt is not None else "decimal",
+                    text.get(qn("w:val")) if text is not None else "%1.",
+                )
+
+    def label(self, paragraph):
+        """``(label, level)`` for a list paragraph, or ``(None, 0)``."""
+        p_pr = paragraph._p.pPr
+        num_pr = p_pr.numPr if p_pr is not None else None
+        if num_pr is None or num_pr.numId is None:
+            style = paragraph.style.name if paragraph.style is not None else ""
+            if style.startswith("List Bullet"):
+                return "•", 0
+            if style.startswith("List Number"):
+                key = ("style", style)
+                self.counters[key] = self.counters.get(key, 0) + 1
+                return f"{self.counters[key]}.", 0
+            return None, 0
+        num_id = str(num_pr.numId.val)
+        level = int(num_pr.ilvl.val) if num_pr.ilvl is not None else 0
+        fmt, text = self.levels.get((num_id, str(level)), ("bullet", "•"))
+        if fmt == "bullet":
+            return "•", level
+        count = self.counters.get((num_id, level), 0) + 1
+        self.counters[(num_id, level)] = count
+        for deeper in [k for k in self.counters if k[0] == num_id and k[1] > level]:
+            del self.counters[deeper] # A new item restarts its sub-lists
+        return text.replace(f"%{level + 1}", _format_number(fmt, count)), level
+
+
+def _roman(n):
+    numerals = ((1000, "M"), (900, "CM"), (500, "D"), (400, "CD"), (100, "C"), (90, "XC"),
+                (50, "L"), (40, "XL"), (10, "X"), (9, "IX"), (5, "V"), (4, "IV"), (1, "I"))
+    out = ""
+    for value, numeral in numerals:
+        while n >= value:
+            out += numeral
+            n -= value
+    return out
+
+
+def _format_number(fmt, n):
+    if fmt == "lowerLetter":
+        return chr(ord("a") + (n - 1) % 26)
+    if fmt == "upperLetter":
+        return chr(ord("A") + (n - 1) % 26)
+    if fmt == "lowerRoman":
+        return _roman(n).lower()
+    if fmt == "upperRoman":
+        return _roman(n)
+    return str(n)
+
+
+class _Renderer:
+    def __init__(self, document, frame_width, frame_height):
+        self.document = document
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.unicode_available = register_unicode_font()
+        self.numbering = _Numbering(document)
+        self.base_size = _style_value(document.styles["Normal"], "size") if "Normal" in document.styles else None
+        self.base_size = self.base_size.pt if self.base_size is not None else DEFAULT_FONT_SIZE
+        self.images = 0
+        self.skipped_images = 0
+
+    def blocks(self, parent, width):
+        """Flowables for the paragraphs and tables of ``parent`` (a body or table cell), in order."""
+        flowables = []
+        for child in parent.iterchildren():
+            if child.tag == qn("w:p"):
+                flowables.extend(self.paragraph(DocxParagraph(child, self.document.part), width))
+            elif child.tag == qn("w:tbl"):
+                flowables.append(self.table(DocxTable(child, self.document.part), width))
+            elif child.tag == qn("w:sdt"): # Content control around whole paragraphs/tables
+                content = child.find(qn("w:sdtContent"))
+                if content is not None:
+                    flowables.extend(self.blocks(content, width))
+        return flowables
+
+    # ---------------- Paragraphs ----------------
+    def _style(self, paragraph, font):
+        style = paragraph.style
+        name = style.name if style is not None else "Normal"
+        size = _style_value(style, "size") if style is not None else None
+        size = size.pt if size is not None else HEADING_SIZES.get(name, self.base_size)
+        fmt = paragraph.paragraph_format
+        return ParagraphStyle(
+            name,
+            fontName=font,
+            fontSize=size,
+            leading=size * LINE_SPACING,
+            alignment=ALIGNMENTS.get(paragraph.alignment, TA_LEFT),
+            leftIndent=fmt.left_indent.pt if fmt.left_indent is not None else 0,
+            firstLineIndent=fmt.first_line_indent.pt if fmt.first_line_indent is not None else 0,
+            spaceBefore=fmt.space_before.pt if fmt.space_before is not None else (12 if name in HEADING_SIZES else 0),
+            spaceAfter=fmt.space_after.pt if fmt.space_after is not None else 6,
+        ), name in HEADING_SIZES or bool(_style_value(style, "bold") if style is not None else False)
+
+    def _run_markup(self, run, bold_style):
+        text = escape(run.text).replace("\t", "&nbsp;" * 4).replace("\n", "<br/>")
+        if not text:
+            return ""
+        font = run.font
+        attributes = []
+        if font.size is not None:
+            attributes.append(f'size="{font.size.pt:g}"')
+        rgb = font.color.rgb if font.color is not None and font.color.type is not None else None
+        if rgb is not None:
+            attributes.append(f'color="#{rgb}"')
+        if attributes:
+            text = f"<font {' '.join(attributes)}>{text}</font>"
+        if run.bold or (bold_style and run.bold is None):
+            text = f"<b>{text}</b>"
+        if run.italic:
+            text = f"<i>{text}</i>"
+        if run.underline:
+            text = f"<u>{text}</u>"
+        if font.strike:
+            text = f"<strike>{text}</strike>"
+        if font.superscript:
+            text = f"<super>{text}</super>"
+        elif font.subscript:
+            text = f"<sub>{text}</sub>"
+        return text
+
+    def _image(self, blip, extent, width):
+        part = self.document.part.related_parts.get(blip)
+        if part is None:
+            return None
+        draw_width, draw_height = (int(extent.get("cx")) / EMU_PER_POINT, int(extent.get("cy")) / EMU_PER_POINT)
+        # Shrink to fit the frame both ways; platypus can't split an image
+        scale = min(1.0, width / draw_width if draw_width else 1.0,
+                    self.frame_height / draw_height if draw_height else 1.0)
+        draw_width, draw_height = draw_width * scale, draw_height * scale
+        try:
+            image = Image(io.BytesIO(part.blob), width=draw_width, height=draw_height)
+            image.hAlign = "LEFT"
+        except Exception: # EMF/WMF and other formats reportlab can't read
+            self.skipped_images += 1
+            return None
+        self.images += 1
+        return image
+
+    def _items(self, paragraph, parent=None, link=None):
+        """Runs (with the link they belong to) in document order.
+
+        Runs inside tracked insertions, inline content controls and smart tags
+        are included; tracked deletions are not.
+        """
+        for child in (paragraph._p if parent is None else parent).iterchildren():
+            if child.tag == qn("w:r"):
+                yield DocxRun(child, paragraph), link
+            elif child.tag == qn("w:hyperlink"):
+                r_id = child.get(qn("r:id"))
+                rel = self.document.part.rels.get(r_id) if r_id else None
+                yield from self._items(paragraph, child, rel.target_ref if rel is not None and rel.is_external else None)
+            elif child.tag in _RUN_CONTAINERS:
+                yield from self._items(paragraph, child, link)
+            elif child.tag == qn("w:sdt"):
+                content = child.find(qn("w:sdtContent"))
+                if content is not None:
+                    yield from self._items(paragraph, content, link)
+
+    def paragraph(self, paragraph, width):
+        items = list(self._items(paragraph))
+        font = _font_for("".join(run.text for run, _ in items), self.unicode_available)
+        style, bold_style = self._style(paragraph, font)
+        label, level = self.numbering.label(paragraph)
+        if label is not None:
+            style.leftIndent += 18 * (level + 1)
+            style.bulletIndent = style.leftIndent - 14
+            style.bulletFontName = font
+
+        flowables = []
+        if paragraph.paragraph_format.page_break_before:
+            flowables.append(PageBreak())
+        markup = []
+
+        def flush():
+            if markup:
+                flowables.append(Paragraph("".join(markup), style, bulletText=label))
+                markup.clear()
+
+        for run, link in items:
+            r = run._r
+            text = self._run_markup(run, bold_style)
+            if link and text:
+                href = escape(link, {'"': "&quot;"})
+                text = f'<a href="{href}" color="blue"><u>{text}</u></a>'
+            markup.append(text)
+            for drawing in r.iter(qn("w:drawing")):
+                blip = drawing.find(".//" + qn("a:blip"))
+                extent = drawing.find(".//" + qn("wp:extent"))
+                if blip is not None and extent is not None:
+                    image = self._image(blip.get(qn("r:embed")), extent, width - style.leftIndent)
+                    if image is not None:
+                        flush()
+                        flowables.append(image)
+            if r.xpath('./w:br[@w:type="page"]'):
+                flush()
+                flowables.append(PageBreak())
+        if not any(markup) and not flowables:
+            return [Spacer(1, style.leading + style.spaceAfter)] # Keep blank lines as vertical space
+        if any(markup):
+            flush()
+        return flowables
+
+    # ---------------- Tables ----------------
+    def table(self, table, width):
+        rows = table.rows
+        grid = []
+        for row in rows:
+            before = getattr(row, "grid_cols_before", 0)
+            after = getattr(row, "grid_cols_after", 0)
+            grid.append([None] * before + list(row.cells) + [None] * after)
+        columns = max((len(r) for r in grid), default=0)
+        for r in grid:
+            r.extend([None] * (columns - len(r)))
+        if not columns:
+            return Spacer(1, 0)
+
+        col_widths = []
+        for column in table.columns:
+            try:
+                col_widths.append(column.width.pt if column.width is not None else None)
+            except (IndexError, AttributeError):
+                col_widths.append(None)
+        if len(col_widths) != columns or None in col_widths:
+            col_widths = [width / columns] * columns
+        scale = min(1.0, width / sum(col_widths)) if sum(col_widths) else 1.0
+        col_widths = [w * scale for w in col_widths]
+
+        data, spans, seen = [], [], {}
+        padding = 8
+        # Images in a cell must also leave room for its top/bottom padding (3pt each)
+        self.frame_height -= 6
+        try:
+            for r, cells in enumerate(grid):
+                row_data = []
+                for c, cell in enumerate(cells):
+                    if cell is None:
+                        row_data.append("")
+                        continue
+                    origin = seen.get(id(cell._tc))
+                    if origin is None:
+                        seen[id(cell._tc)] = (c, r, c, r)
+                        row_data.append(self.blocks(cell._tc, col_widths[c] - padding))
+                    else:
+                        seen[id(cell._tc)] = (origin[0], origin[1], max(origin[2], c), max(origin[3], r))
+                        row_data.append("")
+                data.append(row_data)
+        finally:
+            self.frame_height += 6
+        for c0, r0, c1, r1 in seen.values():
+            if (c0, r0) != (c1, r1):
+                spans.append(("SPAN", (c0, r0), (c1, r1)))
+
+        # splitInRow lets a row taller than the page continue on the next one
+        flowable = Table(data, colWidths=col_widths, hAlign="LEFT", splitInRow=1)
+        flowable.setStyle(TableStyle([
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("LEFTPADDING", (0, 0), (-1, -1), padding / 2),
+            ("RIGHTPADDING", (0, 0), (-1, -1), padding / 2),
+        ] + spans))
+        return flowable
+
+
+def _page_setup(document):
+    section = document.sections[0] if document.sections else None
+    if section is None or section.page_width is None or section.page_height is None:
+        return A4, (72, 72, 72, 72)
+
+    def points(length, default=72):
+        return length.pt if length is not None else default
+
+    pagesize = (section.page_width.pt, section.page_height.pt)
+    return pagesize, (points(section.left_margin), points(section.right_margin),
+                      points(section.top_margin), points(section.bottom_margin))
+
+
+def _header_footer(document, pagesize, margins, font_size):
+    """``onPage`` callback drawing the first section's header/footer text."""
+    section = document.sections[0] if document.sections else None
+    header = footer = ""
+    if section is not None:
+        header = " ".join(p.text for p in section.header.paragraphs if p.text.strip())
+        footer = " ".join(p.text for p in section.footer.paragraphs if p.text.strip())
+    unicode_available = register_unicode_font()
+    left, _, top, bottom = margins
+
+    def draw(canvas, doc):
+        canvas.saveState()
+        if header:
+            canvas.setFont(_font_for(header, unicode_available), font_size)
+            canvas.drawString(left, pagesize[1] - top / 2, header)
+        if footer:
+            canvas.setFont(_font_for(footer, unicode_available), font_size)
+            canvas.drawString(left, bottom / 2, footer)
+        canvas.restoreState()
+    return draw
+
+
+def render_docx_pdf(input_path, output_path, progress=None):
+    """Render the .docx at ``input_path`` to PDF with reportlab.
+
+    Returns ``{"pages", "images", "skipped_images", "unsupported"}``;
+    ``unsupported`` lists content that was left out (see ``unsupported_features``).
+    ``progress(fraction)`` is called after parsing and after layout.
+    """
+    global _unicode_family
+    with stage("parse"):
+        document = Document(input_path)
+    if register_unicode_font() and not _unicode_family:
+        # Only the regular face is bundled, so bold/italic fall back to it
+        registerFontFamily(UNICODE_FONT, normal=UNICODE_FONT, bold=UNICODE_FONT,
+                           italic=UNICODE_FONT, boldItalic=UNICODE_FONT)
+        _unicode_family = True
+
+    pagesize, margins = _page_setup(document)
+    left, right, top, bottom = margins
+    # SimpleDocTemplate's frame keeps 6pt of padding on every side
+    frame_width = pagesize[0] - left - right - 12
+    frame_height = pagesize[1] - top - bottom - 12
+    renderer = _Renderer(document, frame_width, frame_height)
+    with stage("flowables"):
+        story = renderer.blocks(document.element.body, frame_width)
+    if progress:
+        progress(0.5)
+
+    template = SimpleDocTemplate(
+        output_path, pagesize=pagesize, leftMargin=left, rightMargin=right, topMargin=top, bottomMargin=bottom,
+        title=document.core_properties.title or "", author=document.core_properties.author or "",
+    )
+    on_page = _header_footer(document, pagesize, margins, max(renderer.base_size - 2, 6))
+    with stage("layout"): # Platypus lays out and writes pages in one pass
+        template.build(story or [Spacer(1, 0)], onFirstPage=on_page, onLaterPages=on_page)
+    if progress:
+        progress(1.0)
+    return {
+        "pages": template.page,
+        "images": renderer.images,
+        "skipped_images": renderer.skipped_images,
+        "unsupported": unsupported_features(document),
+    }
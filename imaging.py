@@ -0,0 +1,377 @@
+"""Image helpers for the Image Resizer tab.
+
+The "By File Size (KB)" mode used to step JPEG quality down by 5 and re-encode
+the full image on every step. ``compress_to_target`` instead predicts a starting
+point from a thumbnail, bisects quality on the full image, and falls back to
+downscaling when even the lowest quality is still too large.
+
+"By Dimensions" resizes go through ``fast_resize``: JPEGs are decoded at a
+reduced scale with ``draft()``, the rest of the shrink uses ``reduce()`` via
+``reducing_gap``, and very large strip/tile TIFFs can be resized band by band.
+"""
+import io
+import math
+from dataclasses import dataclass
+
+import PIL
+from PIL import Image
+
+THUMBNAIL_SIDE = 256
+THUMBNAIL_QUALITIES = (5, 20, 40, 60, 80, 95)
+
+RESAMPLE_FILTERS = {
+    "Lanczos": Image.LANCZOS,
+    "Bicubic": Image.BICUBIC,
+    "Hamming": Image.HAMMING,
+    "Bilinear": Image.BILINEAR,
+    "Box": Image.BOX,
+    "Nearest": Image.NEAREST,
+}
+DEFAULT_FILTER = "Bicubic"
+# resize() first shrinks by an integer factor with reduce() while the image is
+# still at least this many times larger than the target, then resamples.
+REDUCING_GAP = 3.0
+# TIFFs at least this large are decoded in horizontal bands when tiling is allowed
+TILED_MIN_PIXELS = 64 * 1000 * 1000
+TILE_BAND_ROWS = 1024
+# Band decoding rewrites private TIFF fields (_size, _tile_size), so it is only
+# used on the Pillow major versions it was written for; others resize in one go
+TILED_PILLOW_MAJORS = range(9, 13)
+# Cache key version for "By Dimensions" results; bump when their pixels change
+RESIZE_VERSION = 2
+
+
+@dataclass
+class CompressionResult:
+    data: bytes
+    quality: int
+    scale: float
+    encodes: int
+    width: int
+    height: int
+
+    @property
+    def size_kb(self):
+        return len(self.data) / 1024
+
+
+def to_rgb(image):
+    """Return an RGB copy of ``image``, flattening transparency onto white."""
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        bg = Image.new("RGB", image.size, (255, 255, 255))
+        bg.paste(image, (0, 0), image)
+        return bg
+    return image.convert("RGB")
+
+
+def open_for_resize(source):
+    """Open an image and make it saveable; returns ``(image, image_format)``.
+
+    Anything that isn't RGB or grayscale is flattened to RGB and will be saved
+    as JPEG (PNGs with transparency get a white background).
+    """
+    image = Image.open(source)
+    image_format = image.format or "PNG" # Store original format
+    if image.mode not in ("RGB", "L"):
+        image = to_rgb(image)
+        image_format = "JPEG"
+    return image, image_format
+
+
+def fit_size(size, box):
+    """Largest size with the aspect ratio of ``size`` that fits inside ``box``."""
+    scale = min(box[0] / float(size[0]), box[1] / float(size[1]))
+    return max(1, int(size[0] * scale)), max(1, int(size[1] * scale))
+
+
+def encode_jpeg(image, quality):
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _resizable(image):
+    # Palette and 1-bit images only resample with NEAREST, so expand them first
+    if image.mode == "P":
+        return image.convert("RGBA" if "transparency" in image.info else "RGB")
+    if image.mode == "1":
+        return image.convert("L")
+    return image
+
+
+def _saveable(image, image_format):
+    if image.mode not in ("RGB", "L"):
+        return to_rgb(image), "JPEG"
+    return image, image_format
+
+
+def can_tile(image):
+    """Whether ``image`` is a TIFF whose strips/tiles Pillow can decode one band at a time."""
+    return (
+        int(PIL.__version__.split(".")[0]) in TILED_PILLOW_MAJORS
+        and image.format == "TIFF"
+        and len(image.tile) > 1
+        and all(tile[0] != "libtiff" for tile in image.tile)
+    )
+
+
+def _load_rows(data, top, bottom):
+    """Decode only the TIFF strips/tiles overlapping rows ``[top, bottom)``.
+
+    Returns ``(band, band_top)``; the band starts at the first selected strip,
+    which may lie above ``top``.
+    """
+    image = Image.open(io.BytesIO(data))
+    tiles = [t for t in image.tile if t[1][3] > top and t[1][1] < bottom]
+    band_top = min(t[1][1] for t in tiles)
+    band_bottom = max(t[1][3] for t in tiles)
+    shifted = []
+    for tile in tiles:
+        x0, y0, x1, y1 = tile[1]
+        extents = (x0, y0 - band_top, x1, y1 - band_top)
+        shifted.append(tile._replace(extents=extents) if hasattr(tile, "_replace") else (tile[0], extents) + tuple(tile[2:]))
+    image.tile = shifted
+    image._size = (image.width, band_bottom - band_top)
+    if hasattr(image, "_tile_size"): # Newer Pillow allocates TIFFs from this, not _size
+        image._tile_size = image._size
+    image.load()
+    return image, band_top
+
+
+def _nearest_rows(src_h, out_h):
+    """Source row of every output row in a one-shot NEAREST resize.
+
+    Mirrors Pillow's affine nearest scaling, which steps a float accumulator
+    by ``src_h / out_h`` from half a step in; a band resized on its own starts
+    a fresh accumulator and can land one row off at the seams.
+    """
+    step = float(src_h) / out_h
+    y, rows = step * 0.5, []
+    for _ in range(out_h):
+        rows.append(min(src_h - 1, int(y)))
+        y += step
+    return rows
+
+
+def _tiled_resize(data, size, resample):
+    """Resize a big strip/tile TIFF band by band so only one band is in memory.
+
+    NEAREST matches a one-shot resize exactly. The other filters resample
+    each band with ``resize(box=...)``, which can't reproduce Pillow's
+    whole-image filter windows bit for bit: smooth filters may differ by one
+    level, and BOX rows next to a band edge can take one source row more or less.
+    """
+    with Image.open(io.BytesIO(data)) as header:
+        src_w, src_h = header.size
+    out_w, out_h = size
+    scale_y = src_h / float(out_h)
+    # Source rows each output row depends on beyond its own span (filter support)
+    pad = int(math.ceil(3 * max(scale_y, 1.0))) + 2
+    out_band = max(1, int(TILE_BAND_ROWS / scale_y))
+    nearest = _nearest_rows(src_h, out_h) if resample == Image.NEAREST else None
+
+    output = None
+    for oy0 in range(0, out_h, out_band):
+        oy1 = min(out_h, oy0 + out_band)
+        if nearest is not None:
+            rows = nearest[oy0:oy1]
+            band, band_top = _load_rows(data, rows[0], rows[-1] + 1)
+            band = _resizable(band)
+            # Columns are resized as in the one-shot case; rows are picked from the map above
+            band = band.resize((out_w, band.height), resample)
+            piece = Image.new(band.mode, (out_w, oy1 - oy0))
+            for i, row in enumerate(rows):
+                piece.paste(band.crop((0, row - band_top, out_w, row - band_top + 1)), (0, i))
+        else:
+            sy0, sy1 = oy0 * scale_y, oy1 * scale_y
+            band, band_top = _load_rows(data, max(0, int(sy0) - pad), min(src_h, int(math.ceil(sy1)) + pad))
+            band = _resizable(band)
+            piece = band.resize(
+                (out_w, oy1 - oy0), resample, box=(0, sy0 - band_top, src_w, sy1 - band_top)
+            )
+        band.close()
+        if output is None:
+            output = Image.new(piece.mode, size)
+        output.paste(piece, (0, oy0))
+    return output
+
+
+def fast_resize(data, size, resample=None, tiled=False, tiled_min_pixels=TILED_MIN_PIXELS):
+    """Decode and resize image bytes with as little full-resolution work as possible.
+
+    JPEGs are decoded with ``draft()`` so the DCT scaling returns a smaller
+    image straight from the decoder; ``resize()`` then uses ``reduce()`` for
+    the remaining integer shrink. Colour conversion happens after shrinking.
+    With ``tiled=True``, strip/tile TIFFs of at least ``tiled_min_pixels`` are
+    processed in bands.
+    Returns ``(image, image_format)`` where the image is RGB or L.
+    """
+    resample = RESAMPLE_FILTERS[DEFAULT_FILTER] if resample is None else resample
+    image = Image.open(io.BytesIO(data))
+    image_format = image.format or "PNG" # Store original format
+
+    if tiled and can_tile(image) and image.width * image.height >= tiled_min_pixels:
+        image.close()
+        return _saveable(_tiled_resize(data, size, resample), image_format)
+
+    if image.format == "JPEG" and size[0] < image.width and size[1] < image.height:
+        image.draft(image.mode, size)
+    image = _resizable(image)
+    shrinking = size[0] < image.width or size[1] < image.height
+    resized = image.resize(size, resample, reducing_gap=REDUCING_GAP if shrinking else None)
+    return _saveable(resized, image_format)
+
+
+def encode_resized(image, image_format):
+    """Encode a resized image; returns ``(data, file_ext, mime_type)``.
+
+    JPEG sources stay JPEG (quality 95); everything else is saved as PNG.
+    """
+    buf = io.BytesIO()
+    if image_format == "JPEG":
+        image.save(buf, format="JPEG", quality=95)
+        return buf.getvalue(), "jpg", "image/jpeg"
+    image.save(buf, format="PNG")
+    return buf.getvalue(), "png", "image/png"
+
+
+def resize_file(data, size, resample=None, tiled=False, tiled_min_pixels=TILED_MIN_PIXELS):
+    """``fast_resize`` + ``encode_resized`` for raw image bytes."""
+    image, image_format = fast_resize(data, size, resample, tiled, tiled_min_pixels)
+    return encode_resized(image, image_format)
+
+
+def _scaled(image, scale):
+    if scale >= 1:
+        return image
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+class _SizeModel:
+    """Predicts full-resolution JPEG size per quality from a thumbnail encode.
+
+    Thumbnail bytes are scaled by the pixel ratio, then corrected by the ratio
+    seen on each real full-resolution encode, interpolated across quality.
+    Between two real encodes at the current scale the prediction comes from
+    those sizes alone (log-linear in quality), since they beat any thumbnail.
+    """
+
+    def __init__(self, image):
+        thumb = image.copy()
+        thumb.thumbnail((THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+        pixel_ratio = (image.width * image.height) / float(thumb.width * thumb.height)
+        self.points = [(q, len(encode_jpeg(thumb, q)) * pixel_ratio) for q in THUMBNAIL_QUALITIES]
+        self.corrections = {}
+        self.scale = 1.0
+        self.sizes = {} # Real encodes at self.scale, by quality
+
+    @staticmethod
+    def _interpolate(points, x):
+        if x <= points[0][0]:
+            return points[0][1]
+        if x >= points[-1][0]:
+            return points[-1][1]
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if x0 <= x <= x1:
+                return y0 + (y1 - y0) * (x - x0) / float(x1 - x0)
+
+    def _raw(self, quality, scale):
+        return self._interpolate(self.points, quality) * scale * scale
+
+    def predict(self, quality, scale=1.0):
+        if scale == self.scale and quality in self.sizes:
+            return self.sizes[quality]
+        if scale == self.scale:
+            below = [q for q in self.sizes if q < quality]
+            above = [q for q in self.sizes if q > quality]
+            if below and above:
+                q0, q1 = max(below), min(above)
+                s0, s1 = self.sizes[q0], self.sizes[q1]
+                return s0 * (s1 / s0) ** ((quality - q0) / float(q1 - q0))
+        correction = 1.0
+        if self.corrections:
+            correction = self._interpolate(sorted(self.corrections.items()), quality)
+        return self._raw(quality, scale) * correction
+
+    def quality_for(self, target, lo, hi, scale=1.0):
+        """Highest quality in ``[lo, hi]`` predicted to fit under ``target``."""
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.predict(mid, scale) <= target:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def observe(self, quality, scale, actual):
+        self.corrections[quality] = actual / self._raw(quality, scale)
+        if scale != self.scale:
+            self.scale, self.sizes = scale, {}
+        self.sizes[quality] = actual
+
+
+def compress_to_target(image, target_kb, tolerance=0.05, min_quality=5, max_quality=95,
+                       max_encodes=5, allow_downscale=True):
+    """Encode ``image`` as JPEG as close to (but not above) ``target_kb`` as possible.
+
+    The search stops as soon as a result lands within ``tolerance`` (a fraction
+    of the target) below the target, or after ``max_encodes`` full-size encodes.
+    The image is only downscaled once a real encode at ``min_quality`` is too
+    big. If no encode fits, the smallest one produced is returned.
+    """
+    image = to_rgb(image)
+    target = target_kb * 1024
+    floor = target * (1 - tolerance)
+    aim = (target + floor) / 2 # Middle of the accepted window, so a small misprediction still lands in it
+    model = _SizeModel(image)
+
+    scale = 1.0
+    working = image
+    lo, hi = min_quality, max_quality
+    best = None
+    smallest = None
+    encodes = 0
+    # Predicted not to fit even at the lowest quality: check that with a real encode first
+    quality = min_quality if allow_downscale and model.predict(min_quality) > target else None
+
+    while encodes < max_encodes:
+        if quality is None:
+            quality = model.quality_for(aim, lo, hi, scale)
+            known = model.sizes if model.scale == scale else {}
+            if known and not (lo - 1 in known and hi + 1 in known):
+                # Until real encodes bracket the range, keep the thumbnail's guess away
+                # from its edges so every step still shrinks it like a plain bisection
+                margin = (hi - lo) // 4
+                quality = min(max(quality, lo + margin), hi - margin)
+        data = encode_jpeg(working, quality)
+        encodes += 1
+        model.observe(quality, scale, len(data))
+        result = CompressionResult(data, quality, scale, encodes, working.width, working.height)
+
+        if len(data) <= target:
+            if best is None or len(data) > len(best.data):
+                best = result
+            if len(data) >= floor:
+                break
+            lo = quality + 1
+        else:
+            if smallest is None or len(data) < len(smallest.data):
+                smallest = result
+            hi = quality - 1
+        quality = None
+
+        if lo > hi:
+            if best is not None or hi >= min_quality or not allow_downscale:
+                break
+            # Even the lowest quality is too big: shrink using the observed size.
+            scale *= math.sqrt(floor / float(len(data)))
+            working = _scaled(image, scale)
+            lo, hi = min_quality, max_quality
+
+    chosen = best or smallest
+    chosen.encodes = encodes
+    return chosen
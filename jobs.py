@@ -0,0 +1,317 @@
+"""Background conversion jobs with a SQLite job table.
+
+A conversion submitted to ``JobQueue`` gets an ID, its input is stored under
+the jobs directory and it runs on a worker thread, so it no longer depends on
+the Streamlit script run (or browser connection) that started it. Progress
+reported by the converter is written to the job row, finished outputs stay on
+disk until their TTL passes, and jobs that were queued or running when the
+process stopped are started again on the next start-up. Each job's stage
+timings (see telemetry.py), including the upload write and download reads, are
+kept in its ``telemetry`` column. Outputs are hard-linked with their result cache
+entries rather than copied; nothing rewrites a finished output in place.
+
+    python jobs.py list
+    python jobs.py cleanup
+"""
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field
+
+from cache import hash_file
+from conversions import ConversionError, cached_convert, convert
+from telemetry import Telemetry, emit_stage, recording
+
+DEFAULT_JOBS_DIR = os.environ.get(
+    "MIVI_JOBS_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mivi-converter-jobs")
+)
+DEFAULT_WORKERS = int(os.environ.get("MIVI_JOB_WORKERS", "2"))
+DEFAULT_TTL_HOURS = float(os.environ.get("MIVI_JOB_TTL_HOURS", "24"))
+# Progress is written at most this often, except for the final update
+PROGRESS_INTERVAL = 0.5
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    conversion_type TEXT NOT NULL,
+    input_name TEXT NOT NULL,
+    output_name TEXT NOT NULL,
+    options TEXT NOT NULL,
+    input_digest TEXT,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    telemetry TEXT
+)
+"""
+
+
+@dataclass
+class Job:
+    id: str
+    conversion_type: str
+    input_name: str
+    output_name: str
+    options: dict
+    input_digest: str
+    status: str
+    progress: int
+    message: str
+    result: dict = field(default_factory=dict)
+    error: str = None
+    created: float = 0.0
+    started: float = None
+    finished: float = None
+    telemetry: dict = field(default_factory=dict)
+
+    @property
+    def seconds(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    @classmethod
+    def from_row(cls, row):
+        values = dict(row)
+        values["options"] = json.loads(values["options"])
+        values["result"] = json.loads(values["result"]) if values["result"] else {}
+        values["telemetry"] = json.loads(values["telemetry"]) if values.get("telemetry") else {}
+        return cls(**values)
+
+
+class JobQueue:
+    def __init__(self, directory=DEFAULT_JOBS_DIR, workers=DEFAULT_WORKERS, ttl_hours=DEFAULT_TTL_HOURS,
+                 cache=None, start=True):
+        """``start=False`` opens the job table without running anything (for inspection/cleanup)."""
+        self.directory = directory
+        self.ttl = ttl_hours * 3600
+        self.cache = cache
+        self.db_path = os.path.join(directory, "jobs.sqlite3")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(_SCHEMA)
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            if "telemetry" not in columns: # Job tables created before telemetry was recorded
+                db.execute("ALTER TABLE jobs ADD COLUMN telemetry TEXT")
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mivi-job") if start else None
+        if start:
+            self.cleanup()
+            self._resume()
+
+    @contextmanager
+    def _connect(self):
+        """A connection for one transaction (committed, or rolled back on error), closed afterwards."""
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as db:
+            db.row_factory = sqlite3.Row
+            with db:
+                yield db
+
+    def _update(self, job_id, **values):
+        columns = ", ".join(f"{name} = ?" for name in values)
+        with self._lock, self._connect() as db:
+            db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*values.values(), job_id))
+
+    def job_dir(self, job_id):
+        return os.path.join(self.directory, job_id)
+
+    def _input_path(self, job):
+        ext = os.path.splitext(job.input_name)[1]
+        return os.path.join(self.job_dir(job.id), f"input{ext}")
+
+    def output_path(self, job):
+        return os.path.join(self.job_dir(job.id), job.output_name)
+
+    # ---------------- Submitting and running ----------------
+    def submit(self, conversion_type, input_name, output_name, options=None, data=None, input_path=None,
+               input_digest=None):
+        """Queue a conversion of ``data`` (bytes or another buffer) or ``input_path``; returns the job ID.
+
+        The input is written to the job folder once; it is the only copy made before the conversion.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        target = os.path.join(self.job_dir(job_id), f"input{os.path.splitext(input_name)[1]}")
+        start = time.perf_counter()
+        if data is not None:
+            with open(target, "wb") as f:
+                f.write(data)
+        else:
+            shutil.copyfile(input_path, target)
+        size = os.path.getsize(target)
+        upload = {"seconds": round(time.perf_counter() - start, 4), "calls": 1, "bytes": size}
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, conversion_type, input_name, output_name, options, input_digest, status,"
+                " message, created, telemetry) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, conversion_type, input_name, output_name, json.dumps(options or {}), input_digest,
+                 QUEUED, "⏳ Waiting for a worker...", time.time(), json.dumps({"stages": {"upload": upload}, "copies": 1, "copied_bytes": size})),
+            )
+        self.executor.submit(self._run, job_id)
+        self.cleanup()
+        return job_id
+
+    def _resume(self):
+        """Re-queue jobs that were interrupted by a restart; their inputs are still on disk."""
+        with self._connect() as db:
+            rows = db.execute("SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created", (QUEUED, RUNNING))
+            job_ids = [row["id"] for row in rows]
+        for job_id in job_ids:
+            self._update(job_id, status=QUEUED, progress=0, message="⏳ Restarted after a server restart...")
+            self.executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        with self._lock, self._connect() as db:
+            # Claim the job atomically, so a cancel can't slip in between
+            claimed = db.execute(
+                "UPDATE jobs SET status = ?, started = ?, message = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), "Starting...", job_id, QUEUED),
+            ).rowcount
+        if not claimed:
+            return
+        last = {"time": 0.0, "percent": -1}
+
+        def report(percent, message=None):
+            now = time.monotonic()
+            if percent == last["percent"] and now - last["time"] < PROGRESS_INTERVAL:
+                return
+            last["time"], last["percent"] = now, percent
+            values = {"progress": max(0, min(int(percent), 100))}
+            if message:
+                values["message"] = message
+            self._update(job_id, **values)
+
+        # Everything after the claim is inside the try, so a claimed job always ends DONE or FAILED
+        input_path = telemetry = None
+        try:
+            job = self.get(job_id)
+            input_path = self._input_path(job)
+            output_path = self.output_path(job)
+            telemetry = Telemetry(job.conversion_type, input_path, output_path, job_id=job_id, source="job")
+            for name, entry in job.telemetry.get("stages", {}).items():
+                telemetry.add(name, entry["seconds"], entry["bytes"], entry["calls"])
+            telemetry.copied(job.telemetry.get("copied_bytes", 0), job.telemetry.get("copies", 0))
+            with recording(telemetry):
+                if self.cache is not None:
+                    result = cached_convert(
+                        self.cache, job.conversion_type, input_path, output_path, progress=report,
+                        input_digest=job.input_digest or hash_file(input_path), link=True, **job.options
+                    )
+                else:
+                    result = convert(job.conversion_type, input_path, output_path, progress=report, **job.options)
+            message = "✅ Served from cache." if result.get("cached") else result.get("message", "✅ Done.")
+            self._update(
+                job_id, status=DONE, progress=100, result=json.dumps(result, default=str),
+                finished=time.time(), message=message, telemetry=json.dumps(telemetry.report, default=str),
+            )
+        except Exception as e:
+            error = str(e) if isinstance(e, ConversionError) else f"{type(e).__name__}: {e}"
+            values = {"telemetry": json.dumps(telemetry.report, default=str)} if telemetry else {}
+            self._update(job_id, status=FAILED, error=error, finished=time.time(), message=f"❌ {error}", **values)
+        finally:
+            if input_path:
+                try:
+                    os.remove(input_path) # The output is all that's kept
+                except OSError:
+                    pass
+
+    def cancel(self, job_id):
+        """Cancel a job that hasn't started; returns whether it was cancelled."""
+        with self._lock, self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, message = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), "Cancelled.", job_id, QUEUED),
+            )
+        return cursor.rowcount == 1
+
+    # ---------------- Reading ----------------
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def jobs(self, job_ids=None, limit=50):
+        """Most recent jobs first, optionally only ``job_ids``."""
+        with self._connect() as db:
+            if job_ids is None:
+                rows = db.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                job_ids = list(job_ids)
+                marks = ", ".join("?" * len(job_ids))
+                rows = db.execute(
+                    f"SELECT * FROM jobs WHERE id IN ({marks}) ORDER BY created DESC", job_ids
+                ).fetchall() if job_ids else []
+        return [Job.from_row(row) for row in rows]
+
+    def read_output(self, job):
+        """The job's output bytes; every read is recorded as the ``download`` stage and one copy."""
+        start = time.perf_counter()
+        with open(self.output_path(job), "rb") as f:
+            data = f.read()
+        entry = emit_stage(
+            job.conversion_type, "download", time.perf_counter() - start, len(data), copies=1,
+            job_id=job.id, source="job",
+        )
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT telemetry FROM jobs WHERE id = ?", (job.id,)).fetchone()
+            report = json.loads(row["telemetry"]) if row and row["telemetry"] else {}
+            total = report.setdefault("stages", {}).setdefault("download", {"seconds": 0.0, "calls": 0, "bytes": 0})
+            total.update(entry, seconds=total["seconds"] + entry["seconds"], calls=total["calls"] + 1,
+                         bytes=total["bytes"] + entry["bytes"])
+            report["copies"] = report.get("copies", 0) + 1
+            report["copied_bytes"] = report.get("copied_bytes", 0) + len(data)
+            db.execute("UPDATE jobs SET telemetry = ? WHERE id = ?", (json.dumps(report, default=str), job.id))
+        return data
+
+    def expires_at(self, job):
+        return job.finished + self.ttl if job.finished else None
+
+    # ---------------- Cleanup ----------------
+    def cleanup(self, now=None):
+        """Delete finished jobs older than the TTL, with their files; returns how many were removed."""
+        cutoff = (now or time.time()) - self.ttl
+        with self._lock, self._connect() as db:
+            rows = db.execute(
+                f"SELECT id FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND finished < ?",
+                (*FINISHED, cutoff),
+            ).fetchall()
+            expired = [row["id"] for row in rows]
+            db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+        for job_id in expired:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        return len(expired)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "list"
+    queue = JobQueue(start=False)
+    if command == "cleanup":
+        print(f"🧹 Removed {queue.cleanup()} expired jobs from {queue.directory}")
+    elif command == "list":
+        for job in queue.jobs():
+            print(f"{job.id}  {job.status:<9} {job.progress:>3}%  {job.conversion_type}  {job.input_name}")
+    else:
+        print("Usage: python jobs.py [list|cleanup]", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
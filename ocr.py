@@ -0,0 +1,172 @@
+"""OCR service layer shared by every OCR path (images and scanned PDF pages).
+
+Images are resampled to a target DPI, converted to grayscale and binarized
+before Tesseract sees them. Several images are OCR'd with a single tesseract
+process by handing it a list file (one image path per line), which saves the
+process start-up and model load that ``pytesseract.image_to_string`` pays per
+image. Time spent in each stage is accumulated in ``OcrEngine.timings``.
+pytesseract is imported on the first OCR call, not when this module loads.
+"""
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+DEFAULT_TARGET_DPI = 300
+# Upscaling never goes past this many pixels (a 300 DPI A3 page is ~17 MP)
+MAX_OCR_PIXELS = 32_000_000
+# Tesseract ends every page of a multi-image run with a form feed
+PAGE_SEPARATOR = "\f"
+
+
+@dataclass
+class OcrSettings:
+    lang: str = "eng"
+    oem: int = 3 # Default engine (LSTM where available)
+    psm: int = 3 # Fully automatic page segmentation
+    target_dpi: int = DEFAULT_TARGET_DPI
+    grayscale: bool = True
+    binarize: bool = True
+    batch_size: int = 16
+
+    @property
+    def config(self):
+        return f"--oem {self.oem} --psm {self.psm}"
+
+
+def otsu_threshold(gray):
+    """Otsu's threshold for an 8-bit grayscale image, from its histogram."""
+    histogram = gray.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_bg, weight_bg, best, threshold = 0.0, 0, -1.0, 127
+    for i, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+    return threshold
+
+
+def preprocess(image, settings, source_dpi=None):
+    """Resample ``image`` to ``settings.target_dpi`` and optionally grayscale/binarize it.
+
+    ``source_dpi`` is a DPI the caller knows to be right (e.g. a rendered PDF
+    page) and may scale the image up. Without it the DPI stored in the image
+    is used, but only to scale down: phones and screenshots tag 72/96 DPI on
+    images that are already plenty large. Upscaling stops at ``MAX_OCR_PIXELS``.
+    """
+    trusted = source_dpi is not None
+    if not trusted:
+        dpi = image.info.get("dpi")
+        source_dpi = float(dpi[0]) if dpi and dpi[0] else None
+    if source_dpi and settings.target_dpi and abs(source_dpi - settings.target_dpi) > 1:
+        scale = settings.target_dpi / source_dpi
+        if scale > 1:
+            budget = (MAX_OCR_PIXELS / (image.width * image.height)) ** 0.5
+            scale = min(scale, budget) if trusted else 1
+        if abs(scale - 1) > 0.01:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.LANCZOS if scale < 1 else Image.BICUBIC)
+
+    if settings.grayscale or settings.binarize:
+        if image.mode in ("RGBA", "LA", "P"):
+            # Transparent areas become white paper, not black
+            image = image.convert("RGBA")
+            background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+            image = Image.alpha_composite(background, image)
+        image = ImageOps.grayscale(image)
+    if settings.binarize:
+        threshold = otsu_threshold(image)
+        image = image.point(lambda v: 255 if v > threshold else 0, mode="1")
+    return image
+
+
+class OcrEngine:
+    def __init__(self, settings=None):
+        self.settings = settings or OcrSettings()
+        self.timings = {}
+        self.images = 0
+        self.calls = 0
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def _tesseract(self, source):
+        import pytesseract
+
+        self.calls += 1
+        with self.timed("tesseract"):
+            return pytesseract.image_to_string(source, lang=self.settings.lang, config=self.settings.config)
+
+    def image_to_string(self, image, source_dpi=None):
+        return self.images_to_strings([image], source_dpi=source_dpi)[0]
+
+    def images_to_strings(self, images, source_dpi=None):
+        """OCR ``images`` in order, ``settings.batch_size`` images per tesseract run."""
+        texts = []
+        batch = max(1, self.settings.batch_size)
+        for start in range(0, len(images), batch):
+            texts.extend(self._run_batch(images[start:start + batch], source_dpi))
+        return texts
+
+    def _run_batch(self, images, source_dpi):
+        with self.timed("preprocess"):
+            prepared = [preprocess(image, self.settings, source_dpi) for image in images]
+        self.images += len(prepared)
+        if len(prepared) == 1:
+            return [self._tesseract(prepared[0])]
+
+        tmp_dir = tempfile.mkdtemp(prefix="mivi_ocr_")
+        try:
+            with self.timed("write"):
+                paths = []
+                for i, image in enumerate(prepared):
+                    path = os.path.join(tmp_dir, f"page_{i:05d}.png")
+                    image.save(path, format="PNG")
+                    paths.append(path)
+                list_path = os.path.join(tmp_dir, "images.txt")
+                with open(list_path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(paths) + "\n")
+
+            output = self._tesseract(list_path)
+            with self.timed("parse"):
+                texts = output.split(PAGE_SEPARATOR)
+                if texts and not texts[-1].strip():
+                    texts.pop()
+            if len(texts) == len(prepared):
+                return texts
+            # Page count mismatch (e.g. an old tesseract without list-file support)
+            return [self._tesseract(image) for image in prepared]
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def stats(self):
+        return {
+            "images": self.images,
+            "tesseract_calls": self.calls,
+            "timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+        }
+
+
+def merge_timings(total, timings):
+    for stage, seconds in timings.items():
+        total[stage] = total.get(stage, 0.0) + seconds
+    return total
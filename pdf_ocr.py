@@ -0,0 +1,120 @@
+"""Streaming OCR for scanned PDFs.
+
+Pages are rasterized in bounded chunks (pdf2image ``first_page``/``last_page``)
+inside worker processes, OCR'd there in batched tesseract runs (see ocr.py),
+and only the text is sent back. The chunk size is derived from the DPI and a
+memory ceiling so a 300-page scan never holds more than a few pages of pixels
+per worker. pdf2image and PyPDF2 are imported when a PDF is first OCR'd, so
+importing this module for its defaults stays cheap.
+"""
+import os
+from concurrent.futures import as_completed
+from dataclasses import replace
+
+from ocr import OcrEngine, OcrSettings, merge_timings
+from pools import process_pool
+from telemetry import add_cpu, worker_cpu_seconds
+
+DEFAULT_DPI = 200
+DEFAULT_MAX_MEMORY_MB = 1024
+
+
+def _page_bytes(pdf_path, dpi):
+    """Worst-case RGB raster size of one page at ``dpi``, plus the page count."""
+    from pdf2image import pdfinfo_from_path
+    from PyPDF2 import PdfReader
+
+    try:
+        reader = PdfReader(pdf_path)
+        largest = 0
+        for page in reader.pages:
+            box = page.mediabox
+            largest = max(largest, float(box.width) * float(box.height))
+        page_count = len(reader.pages)
+    except Exception:
+        # PyPDF2 can't parse some damaged files that Poppler still renders
+        info = pdfinfo_from_path(pdf_path)
+        width, _, height = info.get("Page size", "612 x 792").split()[:3]
+        largest, page_count = float(width) * float(height), int(info["Pages"])
+    # mediabox is in points (1/72 inch); 3 bytes per RGB pixel
+    return int(largest * (dpi / 72.0) ** 2 * 3), page_count
+
+
+def plan_chunks(pages, page_bytes, workers, max_memory_mb):
+    """Split ``pages`` (1-based page numbers) into chunks that fit the memory ceiling.
+
+    Returns ``(chunks, workers)``; ``workers`` may be lowered when a single page
+    per worker would already exceed the ceiling.
+    """
+    budget = max_memory_mb * 1024 * 1024
+    workers = max(1, min(workers, len(pages), budget // max(page_bytes, 1) or 1))
+    chunk_size = max(1, budget // (workers * max(page_bytes, 1)))
+    # Keep every worker busy instead of handing one worker the whole document.
+    chunk_size = min(chunk_size, max(1, -(-len(pages) // workers)))
+
+    chunks, start = [], 0
+    while start < len(pages):
+        chunk = pages[start:start + chunk_size]
+        # pdf2image takes a contiguous range, so break at gaps
+        for i in range(1, len(chunk)):
+            if chunk[i] != chunk[i - 1] + 1:
+                chunk = chunk[:i]
+                break
+        chunks.append(chunk)
+        start += len(chunk)
+    return chunks, workers
+
+
+def _ocr_range(pdf_path, first_page, last_page, dpi, settings):
+    from pdf2image import convert_from_path
+
+    cpu_start = worker_cpu_seconds()
+    # Pages are rendered at the OCR DPI already, so skip the resampling step
+    engine = OcrEngine(replace(settings, target_dpi=None))
+    with engine.timed("rasterize"):
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page)
+    texts = engine.images_to_strings(images, source_dpi=dpi)
+    for image in images:
+        image.close()
+    stats = dict(engine.stats(), cpu_seconds=worker_cpu_seconds() - cpu_start) # Includes tesseract
+    return list(zip(range(first_page, last_page + 1), texts)), stats
+
+
+def ocr_pages(pdf_path, pages=None, dpi=DEFAULT_DPI, workers=None, max_memory_mb=DEFAULT_MAX_MEMORY_MB,
+              progress=None, settings=None, stats=None):
+    """OCR ``pages`` of ``pdf_path`` (1-based, default all) and return ``{page: text}``.
+
+    ``progress(done, total)`` is called after each chunk finishes. If ``stats``
+    is a dict, OCR image/call counts and per-stage timings are added to it.
+    """
+    settings = settings or OcrSettings()
+    page_bytes, page_count = _page_bytes(pdf_path, dpi)
+    pages = sorted(pages) if pages is not None else list(range(1, page_count + 1))
+    if not pages:
+        return {}
+    chunks, workers = plan_chunks(pages, page_bytes, workers or os.cpu_count() or 1, max_memory_mb)
+
+    results = {}
+
+    def collect(texts, chunk_stats):
+        results.update(texts)
+        if stats is not None:
+            stats["images"] = stats.get("images", 0) + chunk_stats["images"]
+            stats["tesseract_calls"] = stats.get("tesseract_calls", 0) + chunk_stats["tesseract_calls"]
+            merge_timings(stats.setdefault("timings", {}), chunk_stats["timings"])
+        if progress:
+            progress(len(results), len(pages))
+
+    if workers == 1:
+        for chunk in chunks:
+            collect(*_ocr_range(pdf_path, chunk[0], chunk[-1], dpi, settings))
+        return results
+
+    # Started from a fork server: this runs on the app's job threads
+    with process_pool(workers, preload=["pdf_ocr"]) as pool:
+        futures = [pool.submit(_ocr_range, pdf_path, chunk[0], chunk[-1], dpi, settings) for chunk in chunks]
+        for future in as_completed(futures):
+            texts, chunk_stats = future.result()
+            add_cpu(chunk_stats["cpu_seconds"]) # Worker processes aren't in this thread's CPU time
+            collect(texts, chunk_stats)
+    return results
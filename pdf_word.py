@@ -0,0 +1,160 @@
+"""Page-sharded PDF ➜ Word with pdf2docx.
+
+Pages that have a text layer are split into contiguous shards, and each shard
+is parsed by pdf2docx in its own worker process. The parsed layout comes back
+as plain data (pdf2docx ``store``/``restore``), and the parent writes every page
+into one .docx in page order. Pages without a usable text layer (scans) are
+handed to an OCR callback one by one and written as text in their place, so a
+single scanned page no longer sends the whole document to OCR.
+
+pdf2docx's own ``multi_processing`` option is not used: it ignores the worker
+count, writes its shard files into the current directory (so two jobs would
+collide) and can't leave pages out.
+
+PyMuPDF doesn't support use from several threads, and the app runs jobs on
+threads, so every PyMuPDF call made in the calling process holds ``FITZ_LOCK``.
+"""
+import os
+import threading
+from concurrent.futures import as_completed
+
+from docx import Document
+from docx.enum.section import WD_SECTION
+from docx.shared import Pt
+from pdf2docx import Converter
+
+from pools import process_pool
+from telemetry import add_cpu, stage, worker_cpu_seconds
+
+# Pages per shard: small enough to spread a long document over every worker and
+# report progress, large enough that re-opening the PDF per shard stays cheap
+SHARD_PAGES = 20
+FITZ_LOCK = threading.Lock()
+
+
+def plan_shards(indexes, workers, shard_pages=SHARD_PAGES):
+    """Split sorted 0-based page ``indexes`` into contiguous shards of at most ``shard_pages``."""
+    if not indexes:
+        return []
+    size = max(1, min(shard_pages, -(-len(indexes) // max(workers, 1))))
+    shards, current = [], [indexes[0]]
+    for index in indexes[1:]:
+        if index != current[-1] + 1 or len(current) >= size:
+            shards.append(current)
+            current = []
+        current.append(index)
+    shards.append(current)
+    return shards
+
+
+def scanned_pages(fitz_doc, min_text_chars):
+    """0-based indexes of pages with images but fewer than ``min_text_chars`` text characters."""
+    pages = []
+    for page in fitz_doc:
+        if len("".join(page.get_text().split())) < min_text_chars and page.get_images():
+            pages.append(page.number)
+    return pages
+
+
+def _parse_shard(pdf_path, indexes, settings):
+    """Worker: parse pages ``indexes``; returns their layout as plain data and the CPU seconds used."""
+    cpu_start = worker_cpu_seconds()
+    cv = Converter(pdf_path)
+    try:
+        cv.load_pages(pages=indexes)
+        settings = dict(cv.default_settings, **settings)
+        pages = cv.parse_document(**settings).parse_pages(**settings).store()["pages"]
+    finally:
+        cv.close()
+    return pages, worker_cpu_seconds() - cpu_start
+
+
+def _text_page(doc, width, height, text):
+    """Add ``text`` (an OCR'd page) as its own section sized like the source page."""
+    section = doc.add_section(WD_SECTION.NEW_PAGE) if doc.paragraphs else doc.sections[0]
+    section.page_width, section.page_height = Pt(width), Pt(height)
+    blocks = [block.strip() for block in text.split("\n\n")]
+    for block in [block for block in blocks if block] or [""]:
+        doc.add_paragraph(block)
+
+
+def convert_pdf_docx(pdf_path, docx_path, workers=None, min_text_chars=20, ocr=None, progress=None,
+                     settings=None):
+    """Convert ``pdf_path`` to ``docx_path`` with pdf2docx on ``workers`` processes (default: all CPUs).
+
+    ``ocr(page_numbers)`` takes 1-based page numbers and returns ``{page: text}``;
+    when given, scanned pages and pages pdf2docx fails on are OCR'd through it.
+    ``progress(done, total)`` is called as parsed shards come back. Returns
+    ``{"pages", "shards", "workers", "ocr_pages", "scanned_pages", "failed_pages"}``
+    with 1-based page numbers.
+    """
+    settings = settings or {}
+    with FITZ_LOCK, stage("classify"):
+        cv = Converter(pdf_path)
+        try:
+            cv.load_pages()
+            scanned = scanned_pages(cv.fitz_doc, min_text_chars)
+            sizes = [(page.rect.width, page.rect.height) for page in cv.fitz_doc]
+        except BaseException:
+            cv.close()
+            raise
+    page_count = len(sizes)
+    try:
+        skip = set(scanned) if ocr else set()
+        parse = [i for i in range(page_count) if i not in skip]
+
+        workers = max(1, min(workers or os.cpu_count() or 1, len(parse) or 1))
+        shards = plan_shards(parse, workers)
+        done = 0
+
+        def collect(pages):
+            nonlocal done
+            cv.restore({"pages": pages})
+            done += len(pages)
+            if progress:
+                progress(done, len(parse))
+
+        with stage("parse"):
+            if workers == 1 or len(shards) == 1:
+                with FITZ_LOCK:
+                    for shard in shards:
+                        collect(_parse_shard(pdf_path, shard, settings)[0])
+            else:
+                with process_pool(workers, preload=["pdf_word"]) as pool:
+                    futures = [pool.submit(_parse_shard, pdf_path, shard, settings) for shard in shards]
+                    for future in as_completed(futures):
+                        pages, cpu = future.result()
+                        add_cpu(cpu) # Worker processes aren't in this thread's CPU time
+                        collect(pages)
+
+        # pdf2docx skips pages it can't parse (ignore_page_error); OCR those too
+        failed = [i for i in parse if not cv.pages[i].finalized]
+        texts = ocr([i + 1 for i in sorted(skip | set(failed))]) if ocr and (skip or failed) else {}
+
+        with stage("encode"):
+            doc, written = Document(), 0
+            for page in cv.pages:
+                if page.finalized:
+                    try:
+                        page.make_docx(doc)
+                        written += 1
+                        continue
+                    except Exception:
+                        failed.append(page.id)
+                if page.id + 1 in texts:
+                    _text_page(doc, *sizes[page.id], texts[page.id + 1])
+                    written += 1
+            if not written:
+                raise ValueError("no page could be converted")
+            doc.save(docx_path)
+    finally:
+        with FITZ_LOCK:
+            cv.close()
+    return {
+        "pages": page_count,
+        "shards": len(shards),
+        "workers": workers,
+        "ocr_pages": sorted(texts),
+        "scanned_pages": [i + 1 for i in scanned],
+        "failed_pages": sorted(i + 1 for i in set(failed) if i + 1 not in texts),
+    }
@@ -0,0 +1,28 @@
+"""Process pools that are safe to start from any thread.
+
+The app runs conversions on job threads (jobs.py). Forking a multi-threaded
+process copies only the calling thread, so a lock another thread held at that
+moment (PyMuPDF, logging, an allocator) stays locked in the child forever.
+Workers are therefore started from a fork server, a clean single-threaded
+process, or spawned where the platform has no fork server.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_preload = ["__main__"]
+
+
+def process_pool(max_workers=None, preload=()):
+    """A ``ProcessPoolExecutor`` whose workers don't inherit the caller's threads.
+
+    ``preload`` names modules the workers import (e.g. ``"pdf_word"``). The fork
+    server imports them once, so workers forked from it start with them loaded
+    instead of each paying the import; this only applies to modules named
+    before the server first starts.
+    """
+    context = multiprocessing.get_context(START_METHOD)
+    if START_METHOD == "forkserver":
+        _preload.extend(name for name in preload if name not in _preload)
+        context.set_forkserver_preload(_preload)
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
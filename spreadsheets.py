@@ -0,0 +1,194 @@
+"""Streaming Excel readers and writers.
+
+Reading uses openpyxl's read-only mode: rows are written to CSV as they are
+read, so memory stays flat no matter how many rows a sheet has, and the
+workbook is parsed exactly once per export. Writing uses xlsxwriter's
+``constant_memory`` mode (openpyxl ``write_only`` when xlsxwriter is missing),
+fed from CSV chunks and rolling over to a new sheet at Excel's row limit.
+"""
+import csv
+import io
+import re
+import time
+import zipfile
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from streaming import DEFAULT_CHUNK_ROWS
+from telemetry import peak_rss_mb, stage, timed_iter
+
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    XLSXWRITER_AVAILABLE = False
+
+EXCEL_MAX_ROWS = 1048576
+
+
+def sheet_names(source):
+    """Sheet names of an .xlsx path or file-like object (reads only the workbook index)."""
+    wb = load_workbook(source, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+
+def _cell(value):
+    return "" if value is None else value
+
+
+def write_sheet_csv(ws, out):
+    """Stream worksheet ``ws`` into the text stream ``out``; returns the data row count."""
+    writer = csv.writer(out, lineterminator="\n")
+    width = ws.max_column if ws.max_column and ws.max_column > 1 else 0
+    pending_blank = 0
+    rows = 0
+    for row in timed_iter(ws.iter_rows(values_only=True), "parse"):
+        if all(value is None for value in row):
+            # Hold back blank rows so trailing ones are dropped, like pandas does
+            pending_blank += 1
+            continue
+        for _ in range(pending_blank):
+            writer.writerow([""] * width)
+        pending_blank = 0
+        values = [_cell(value) for value in row]
+        if len(values) < width:
+            values.extend([""] * (width - len(values)))
+        writer.writerow(values)
+        rows += 1
+    return max(rows - 1, 0) # First row is the header
+
+
+def excel_to_csv(input_path, output_path, sheet_name=None):
+    """Export one sheet (default: the first) to CSV; returns ``(sheet_name, rows)``."""
+    with stage("parse"):
+        wb = load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name is not None else wb.worksheets[0]
+        with open(output_path, "w", encoding="utf-8", newline="") as out, stage("encode"):
+            rows = write_sheet_csv(ws, out)
+        return ws.title, rows
+    finally:
+        wb.close()
+
+
+def _csv_member_name(title, used):
+    name = re.sub(r'[\\/:*?"<>|]+', "_", title).strip() or "Sheet"
+    candidate, n = name, 1
+    while candidate.lower() in used:
+        n += 1
+        candidate = f"{name}_{n}"
+    used.add(candidate.lower())
+    return f"{candidate}.csv"
+
+
+def excel_to_csv_zip(input_path, output_path, progress=None):
+    """Export every sheet to its own CSV inside a zip, in a single workbook pass.
+
+    Returns ``{sheet_name: rows}``. ``progress(done, total, sheet_name)`` is
+    called after each sheet.
+    """
+    with stage("parse"):
+        wb = load_workbook(input_path, read_only=True, data_only=True)
+    counts, used = {}, set()
+    try:
+        with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for i, ws in enumerate(wb.worksheets, 1):
+                with zf.open(_csv_member_name(ws.title, used), "w") as member, stage("encode"):
+                    out = io.TextIOWrapper(member, encoding="utf-8", newline="")
+                    counts[ws.title] = write_sheet_csv(ws, out)
+                    out.flush()
+                    out.detach()
+                if progress:
+                    progress(i, len(wb.worksheets), ws.title)
+    finally:
+        wb.close()
+    return counts
+
+
+class _XlsxWriterBook:
+    def __init__(self, path):
+        self.book = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False})
+
+    def add_sheet(self, name):
+        self.sheet = self.book.add_worksheet(name)
+        self.row = 0
+
+    def append(self, values):
+        self.sheet.write_row(self.row, 0, values)
+        self.row += 1
+
+    def close(self):
+        self.book.close()
+
+
+class _OpenpyxlBook:
+    def __init__(self, path):
+        self.path = path
+        self.book = Workbook(write_only=True)
+
+    def add_sheet(self, name):
+        self.sheet = self.book.create_sheet(name)
+
+    def append(self, values):
+        self.sheet.append(values)
+
+    def close(self):
+        self.book.save(self.path)
+
+
+def _rows(chunk):
+    # NaN -> empty cell; xlsxwriter rejects NaN and openpyxl would write it as a number
+    values = chunk.astype(object).where(chunk.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def csv_to_excel_stream(input_path, output_path, chunksize=DEFAULT_CHUNK_ROWS, max_rows=EXCEL_MAX_ROWS,
+                        progress=None):
+    """Write a CSV of any length to .xlsx, starting a new sheet whenever ``max_rows`` is reached.
+
+    Returns ``{"rows", "sheets", "seconds", "rows_per_sec", "peak_rss_mb", "engine"}``;
+    ``peak_rss_mb`` is process-wide (see ``telemetry.peak_rss_mb``).
+    ``progress(rows, sheets)`` is called after every chunk.
+    """
+    start = time.perf_counter()
+    book = _XlsxWriterBook(output_path) if XLSXWRITER_AVAILABLE else _OpenpyxlBook(output_path)
+    rows, sheets, sheet_rows, header = 0, 0, max_rows, None
+    try:
+        for chunk in timed_iter(pd.read_csv(input_path, chunksize=chunksize), "parse"):
+            if header is None:
+                header = [str(c) for c in chunk.columns]
+            with stage("encode"):
+                for values in _rows(chunk):
+                    if sheet_rows >= max_rows:
+                        sheets += 1
+                        book.add_sheet("Sheet1" if sheets == 1 else f"Sheet{sheets}")
+                        book.append(header)
+                        sheet_rows = 1
+                    book.append(values)
+                    sheet_rows += 1
+                    rows += 1
+            if progress:
+                progress(rows, sheets)
+        if sheets == 0:
+            # Header-only or empty CSV still gets one sheet
+            book.add_sheet("Sheet1")
+            if header:
+                book.append(header)
+            sheets = 1
+    finally:
+        with stage("encode"):
+            book.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "sheets": sheets,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds) if seconds else rows,
+        "peak_rss_mb": peak_rss_mb(),
+        "engine": "xlsxwriter" if XLSXWRITER_AVAILABLE else "openpyxl",
+    }
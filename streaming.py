@@ -0,0 +1,271 @@
+"""Bounded-memory CSV ⇄ JSON converters for multi-GB files.
+
+CSV is read in ``chunksize`` batches and each batch is appended to the output
+as soon as it is serialized. JSON input (a top-level array, an object wrapping
+an array of records, a single object or NDJSON) is decoded one record at a
+time with ``json.JSONDecoder.raw_decode`` over a sliding buffer, normalized in
+batches and flushed to CSV. pandas is imported on first use, so importing
+this module for ``DEFAULT_CHUNK_ROWS`` stays cheap.
+"""
+import csv
+import json
+import os
+import tempfile
+
+from telemetry import stage, timed_iter
+
+DEFAULT_CHUNK_ROWS = 50000 # Rows per chunk for the streaming CSV/JSON/Excel converters
+READ_SIZE = 1024 * 1024
+MAX_VALUE_BYTES = 256 * 1024 * 1024 # Largest single JSON value (or wrapped record) buffered while decoding
+
+
+# ---------------- CSV ➜ JSON ----------------
+def csv_to_json_stream(input_path, output_path, chunksize=DEFAULT_CHUNK_ROWS, ndjson=False, progress=None):
+    """Write ``input_path`` as a JSON array (``indent=2``) or as NDJSON; returns the row count.
+
+    ``progress(rows, fraction)`` is called after every chunk.
+    """
+    import pandas as pd
+
+    rows = 0
+    total = os.path.getsize(input_path) or 1
+    with open(input_path, "rb") as raw, open(output_path, "w", encoding="utf-8") as out:
+        if not ndjson:
+            out.write("[")
+        for chunk in timed_iter(pd.read_csv(raw, chunksize=chunksize), "parse"):
+            if chunk.empty:
+                continue
+            with stage("encode"):
+                if ndjson:
+                    body = chunk.to_json(orient="records", lines=True)
+                    out.write(body if body.endswith("\n") else body + "\n")
+                else:
+                    body = chunk.to_json(orient="records", indent=2).strip()[1:-1].rstrip()
+                    if not body:
+                        continue
+                    out.write("," if rows else "")
+                    out.write(body)
+            rows += len(chunk)
+            if progress:
+                progress(rows, min(raw.tell() / total, 1.0))
+        if not ndjson:
+            out.write("\n]" if rows else "]")
+    return rows
+
+
+# ---------------- JSON ➜ CSV ----------------
+class _ValueTooLarge(ValueError):
+    pass
+
+
+class _JsonReader:
+    """Decodes one JSON value at a time from a text file with ``raw_decode``.
+
+    A value that doesn't fit in the buffer doubles the next read, so it is
+    decoded O(log n) times rather than once per ``read_size``. The buffer is
+    capped at ``max_bytes``.
+    """
+
+    def __init__(self, f, read_size, max_bytes):
+        self.f = f
+        self.read_size = read_size
+        self.max_bytes = max_bytes
+        self.decoder = json.JSONDecoder()
+        self.buf, self.pos, self.eof = "", 0, False
+        self.dropped = 0 # Characters consumed and no longer buffered
+
+    def _fill(self, size):
+        chunk = self.f.read(size)
+        self.eof = not chunk
+        self.dropped += self.pos
+        self.buf, self.pos = self.buf[self.pos:] + chunk, 0
+        return not self.eof
+
+    def tell(self):
+        """Characters consumed so far."""
+        return self.dropped + self.pos
+
+    def peek(self):
+        """The next non-whitespace character (not consumed), or None at the end of the file."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(self.read_size):
+                return None
+
+    def take(self, char):
+        """Consume ``char`` if it is next; returns whether it was."""
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self, max_bytes=None):
+        """Decode the next value; ValueError for invalid JSON or a value over ``max_bytes``."""
+        max_bytes = max_bytes or self.max_bytes
+        if self.peek() is None:
+            raise ValueError("Unexpected end of JSON input")
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the buffer edge may be cut short (e.g. a number)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                # Running out of input fails at (or just before) the end of the buffer,
+                # or at the start of an unterminated string; anything else is a real error
+                if self.eof or (e.pos < len(self.buf) - 16 and not e.msg.startswith("Unterminated string")):
+                    raise ValueError(f"Invalid JSON: {e.msg} (near character {e.pos - self.pos} of a value)")
+            pending = len(self.buf) - self.pos
+            if pending >= max_bytes:
+                raise _ValueTooLarge(f"A single JSON value is larger than {max_bytes // (1024 * 1024)} MB")
+            self._fill(min(max(self.read_size, pending), max_bytes - pending))
+
+    def items(self):
+        """Values of an array whose ``[`` was just consumed, through its ``]``."""
+        if self.take("]"):
+            return
+        while True:
+            yield self.value()
+            if self.take("]"):
+                return
+            if not self.take(","):
+                raise ValueError("Unterminated JSON array" if self.peek() is None else "Expected ',' or ']' in JSON array")
+
+
+def _record(value):
+    return value if isinstance(value, dict) else {"0": value}
+
+
+def _stream_object(reader):
+    """Records from a top-level object whose ``{`` was just consumed (see ``iter_json_records``)."""
+    members, found = {}, False
+    start = reader.tell()
+    if reader.take("}"):
+        yield members
+        return
+    while True:
+        key = reader.value()
+        if not isinstance(key, str) or not reader.take(":"):
+            raise ValueError("Invalid JSON object")
+        if reader.take("["):
+            if not found and reader.peek() == "{":
+                found = True
+                for item in reader.items():
+                    yield _record(item)
+            else:
+                value = list(reader.items())
+                if not found:
+                    members[key] = value
+        else:
+            value = reader.value()
+            if not found:
+                members[key] = value
+        if not found and reader.tell() - start > reader.max_bytes:
+            raise ValueError(f"A single JSON object is larger than {reader.max_bytes // (1024 * 1024)} MB "
+                             "and has no array of records to stream")
+        if reader.take("}"):
+            break
+        if not reader.take(","):
+            raise ValueError("Unterminated JSON object" if reader.peek() is None else "Expected ',' or '}' in JSON object")
+    if not found:
+        yield members
+
+
+def iter_json_records(input_path, read_size=READ_SIZE, max_value_bytes=MAX_VALUE_BYTES):
+    """Yield records from a JSON array, a single JSON value or NDJSON, incrementally.
+
+    A file holding one object with an array-of-objects member (``{"data": [...]}``)
+    yields that array's items, streamed; its other members are dropped. Any other
+    single object is one record. An object too large to decode whole within
+    ``read_size`` is read member by member on that basis, even if NDJSON lines
+    follow it. A value larger than ``max_value_bytes`` raises ValueError instead
+    of being buffered.
+    """
+    with open(input_path, encoding="utf-8") as f:
+        reader = _JsonReader(f, read_size, max_value_bytes)
+        first = reader.peek()
+        if first is None:
+            return
+        if reader.take("["):
+            for value in reader.items():
+                yield _record(value)
+            return
+        if first == "{":
+            try:
+                # Small enough to decode whole: tells a lone wrapper object from NDJSON
+                value = reader.value(max_bytes=read_size)
+            except _ValueTooLarge:
+                reader.take("{")
+                yield from _stream_object(reader)
+            else:
+                if reader.peek() is None:
+                    rows = next((v for v in value.values() if isinstance(v, list) and v and isinstance(v[0], dict)), None)
+                    yield from (map(_record, rows) if rows is not None else [value])
+                    return
+                yield value
+        while reader.peek() is not None:
+            yield _record(reader.value())
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def json_to_csv_stream(input_path, output_path, batch_size=DEFAULT_CHUNK_ROWS, progress=None):
+    """Normalize JSON records in batches and append them to ``output_path``; returns the row count.
+
+    The header comes from the first batch. If later batches add columns, the
+    CSV is re-streamed once at the end with the full, ordered column set.
+    ``progress(rows, None)`` is called after every batch.
+    """
+    import pandas as pd
+
+    columns, extra = None, False
+    rows = 0
+    with open(output_path, "w", encoding="utf-8", newline="") as out:
+        for batch in timed_iter(_batches(iter_json_records(input_path), batch_size), "parse"):
+            with stage("normalize"):
+                df = pd.json_normalize(batch) # Handles nested JSON
+            with stage("encode"):
+                if columns is None:
+                    columns = list(df.columns)
+                    df.to_csv(out, index=False)
+                else:
+                    new = [c for c in df.columns if c not in columns]
+                    if new:
+                        columns.extend(new)
+                        extra = True
+                    df.reindex(columns=columns).to_csv(out, index=False, header=False)
+            rows += len(df)
+            if progress:
+                progress(rows, None)
+
+    if extra:
+        with stage("encode"):
+            _widen_csv(output_path, columns)
+    return rows
+
+
+def _widen_csv(path, columns):
+    """Pad short rows (written before later columns appeared) and rewrite the header."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".csv")
+    with open(path, encoding="utf-8", newline="") as src, os.fdopen(fd, "w", encoding="utf-8", newline="") as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        next(reader, None)
+        writer.writerow(columns)
+        width = len(columns)
+        for row in reader:
+            writer.writerow(row + [""] * (width - len(row)))
+    os.replace(tmp_path, path)
@@ -0,0 +1,422 @@
+"""Per-stage timing, bytes and memory telemetry for conversions.
+
+A ``Telemetry`` object records one conversion run. While it is active (see
+``recording``), code anywhere in the conversion can wrap work in
+``stage("parse", nbytes)``; outside a recording ``stage`` does nothing, so the
+converters stay usable on their own. Full copies of the input or output data
+(upload write, cache copies, download read) are counted with ``copied``.
+Finished runs are appended to a JSON-lines
+log and folded into a Prometheus text file (for node_exporter's textfile
+collector or any scraper that reads the format).
+
+    MIVI_METRICS_DIR   where conversions.jsonl and mivi.prom go
+                       (default ~/.cache/mivi-converter-metrics)
+    MIVI_METRICS=0     turn the log and metrics file off
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import fcntl
+except ImportError: # Windows: no cross-process lock, last writer wins
+    fcntl = None
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+DEFAULT_METRICS_DIR = os.environ.get(
+    "MIVI_METRICS_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mivi-converter-metrics")
+)
+METRICS_ENABLED = os.environ.get("MIVI_METRICS", "1") != "0"
+LOG_NAME = "conversions.jsonl"
+PROM_NAME = "mivi.prom"
+STATE_NAME = "metrics_state.json"
+
+_current = ContextVar("mivi_telemetry", default=None)
+_write_lock = threading.Lock()
+
+
+def _status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this whole process in MB, or None where unsupported.
+
+    Process-wide: since start, or since the last ``reset_peak_rss`` on Linux.
+    """
+    peak_kb = _status_kb("VmHWM:")
+    if peak_kb is not None:
+        return round(peak_kb / 1024, 1)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def reset_peak_rss():
+    """Restart ``peak_rss_mb`` from the current RSS; returns False where that isn't supported (non-Linux).
+
+    Only meaningful in a process that runs one conversion at a time (CLI workers).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def rss_mb():
+    """Current resident set size of this process in MB, or None where unsupported."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _growth(start_mb, end_mb):
+    return round(end_mb - start_mb, 1) if start_mb is not None and end_mb is not None else None
+
+
+def worker_cpu_seconds():
+    """CPU time of this process and its finished children (e.g. tesseract).
+
+    For worker processes that run one task at a time; in the app's server process
+    the children of other job threads would be counted too.
+    """
+    cpu = time.process_time()
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu += children.ru_utime + children.ru_stime
+    return cpu
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+class Telemetry:
+    def __init__(self, conversion_type, input_path=None, output_path=None, exclusive=False, **labels):
+        """``exclusive`` means nothing else runs in this process meanwhile (a CLI
+        worker), so the process peak RSS can be reset and reported per run."""
+        self.conversion_type = conversion_type
+        self.input_path = input_path
+        self.output_path = output_path
+        self.labels = labels
+        self.stages = {}
+        self.notes = {}
+        self._nested = [] # Child seconds of each open stage, innermost last
+        self.copies = 0
+        self.copied_bytes = 0
+        self.child_cpu = 0.0
+        self.peak_scope = "run" if exclusive and reset_peak_rss() else "process"
+        self.rss_start = rss_mb()
+        self.start = time.perf_counter()
+        # This thread only: the app runs other jobs and the server in the same process
+        self.cpu_start = time.thread_time()
+        self.report = None
+
+    def add(self, name, seconds, nbytes=0, calls=1, rss_growth=None):
+        """Record ``seconds`` of work for stage ``name``; ``rss_growth`` is the RSS change in MB over it."""
+        entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "bytes": 0, "rss_growth_mb": None})
+        entry["seconds"] += seconds
+        entry["calls"] += calls
+        entry["bytes"] += nbytes or 0
+        if rss_growth is not None:
+            # Largest growth over one call; other threads' allocations can show up here too
+            entry["rss_growth_mb"] = max(entry["rss_growth_mb"] or 0.0, rss_growth)
+
+    @contextmanager
+    def stage(self, name, nbytes=0):
+        """Time a block as ``name``; time spent in nested stages is not counted twice."""
+        self._nested.append(0.0)
+        rss_start = rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add(name, elapsed - self._nested.pop(), nbytes, rss_growth=_growth(rss_start, rss_mb()))
+            self._child(elapsed)
+
+    def _child(self, seconds):
+        if self._nested:
+            self._nested[-1] += seconds
+
+    def copied(self, nbytes, copies=1):
+        """Count ``copies`` full copies of the input or output data, ``nbytes`` in total."""
+        self.copies += copies
+        self.copied_bytes += nbytes or 0
+
+    def note(self, **values):
+        """Attach extra fields (``cached``, ``pages``, ...) to the report."""
+        self.notes.update(values)
+
+    def add_cpu(self, seconds):
+        """Count CPU ``seconds`` spent in worker processes on this run's behalf."""
+        self.child_cpu += seconds
+
+    def finish(self, status, error=None):
+        seconds = time.perf_counter() - self.start
+        stages = {
+            name: dict(entry, seconds=round(entry["seconds"], 4)) for name, entry in self.stages.items()
+        }
+        self.report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "conversion": self.conversion_type,
+            "status": status,
+            "error": error,
+            "seconds": round(seconds, 4),
+            # This thread plus the worker processes that reported back (add_cpu)
+            "cpu_seconds": round(time.thread_time() - self.cpu_start + self.child_cpu, 4),
+            "worker_cpu_seconds": round(self.child_cpu, 4),
+            "input_bytes": _size(self.input_path),
+            "output_bytes": _size(self.output_path) if status == "ok" else None,
+            "rss_growth_mb": _growth(self.rss_start, rss_mb()),
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_scope": self.peak_scope,
+            "copies": self.copies,
+            "copied_bytes": self.copied_bytes,
+            "stages": stages,
+            **self.labels,
+            **self.notes,
+        }
+        return self.report
+
+
+@contextmanager
+def stage(name, nbytes=0):
+    """Time a block into the active recording; a no-op when nothing is recording."""
+    telemetry = _current.get()
+    if telemetry is None:
+        yield
+        return
+    with telemetry.stage(name, nbytes):
+        yield
+
+
+def timed_iter(iterable, name):
+    """Yield from ``iterable``, counting the time spent producing items as stage ``name``.
+
+    Meant for lazy readers (CSV chunks, worksheet rows) whose parsing happens
+    inside ``next()``; the total is recorded once, when iteration stops.
+    """
+    telemetry = _current.get()
+    if telemetry is None:
+        yield from iterable
+        return
+    iterator, seconds, items, rss_start = iter(iterable), 0.0, 0, rss_mb()
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - start
+                seconds += elapsed
+                telemetry._child(elapsed)
+            items += 1
+            yield item
+    finally:
+        telemetry.add(name, seconds, calls=items, rss_growth=_growth(rss_start, rss_mb()))
+
+
+def add_stage(name, seconds, nbytes=0, calls=1):
+    telemetry = _current.get()
+    if telemetry is not None:
+        telemetry.add(name, seconds, nbytes, calls)
+
+
+def add_cpu(seconds):
+    telemetry = _current.get()
+    if telemetry is not None:
+        telemetry.add_cpu(seconds)
+
+
+def copied(nbytes, copies=1):
+    telemetry = _current.get()
+    if telemetry is not None:
+        telemetry.copied(nbytes, copies)
+
+
+def note(**values):
+    telemetry = _current.get()
+    if telemetry is not None:
+        telemetry.note(**values)
+
+
+def record_ocr(ocr_stats):
+    """Fold an OcrEngine ``stats()`` dict into the active recording as ``ocr.<stage>``."""
+    if not ocr_stats:
+        return
+    # Summed over OCR worker processes, so together they can exceed the wall-clock "ocr" stage
+    for name, seconds in (ocr_stats.get("timings") or {}).items():
+        calls = ocr_stats.get("tesseract_calls", 1) if name == "tesseract" else ocr_stats.get("images", 1)
+        add_stage(f"ocr.{name}", seconds, calls=calls)
+    note(ocr_images=ocr_stats.get("images"), tesseract_calls=ocr_stats.get("tesseract_calls"))
+
+
+@contextmanager
+def recording(telemetry, emit_report=True):
+    """Make ``telemetry`` the active recording; finishes it (and emits it) when the block exits."""
+    token = _current.set(telemetry)
+    try:
+        yield telemetry
+    except BaseException as e:
+        telemetry.finish("error", error=str(e))
+        raise
+    else:
+        telemetry.finish("ok")
+    finally:
+        _current.reset(token)
+        if emit_report and telemetry.report is not None:
+            emit(telemetry.report)
+
+
+# ---------------- Export ----------------
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def _fold(state, report):
+    """Add one run report (or a stage-only report from ``emit_stage``) into the cumulative metrics ``state``."""
+    conversion, status = report["conversion"], report.get("status")
+    if status is not None:
+        runs = state.setdefault("runs", {}).setdefault(conversion, {})
+        runs[status] = runs.get(status, 0) + 1
+        totals = state.setdefault("totals", {}).setdefault(conversion, {
+            "seconds": 0.0, "count": 0, "input_bytes": 0, "output_bytes": 0, "peak_rss_mb": 0.0,
+        })
+        totals["seconds"] += report["seconds"]
+        totals["count"] += 1
+        totals["input_bytes"] += report.get("input_bytes") or 0
+        totals["output_bytes"] += report.get("output_bytes") or 0
+        totals["peak_rss_mb"] = max(totals["peak_rss_mb"], report.get("peak_rss_mb") or 0.0)
+    copies = state.setdefault("copies", {}).setdefault(conversion, {"copies": 0, "bytes": 0})
+    copies["copies"] += report.get("copies") or 0
+    copies["bytes"] += report.get("copied_bytes") or 0
+    stages = state.setdefault("stages", {}).setdefault(conversion, {})
+    for name, entry in report["stages"].items():
+        total = stages.setdefault(name, {"seconds": 0.0, "calls": 0, "bytes": 0})
+        total["seconds"] += entry["seconds"]
+        total["calls"] += entry["calls"]
+        total["bytes"] += entry["bytes"]
+
+
+def render_prometheus(state):
+    lines = [
+        "# HELP mivi_conversions_total Conversions finished, by type and status.",
+        "# TYPE mivi_conversions_total counter",
+    ]
+    for conversion, statuses in sorted(state.get("runs", {}).items()):
+        for status, count in sorted(statuses.items()):
+            lines.append(f"mivi_conversions_total{_labels(conversion=conversion, status=status)} {count}")
+
+    totals = sorted(state.get("totals", {}).items())
+    lines += ["# HELP mivi_conversion_duration_seconds Wall time per conversion.",
+              "# TYPE mivi_conversion_duration_seconds summary"]
+    for conversion, total in totals:
+        lines.append(f"mivi_conversion_duration_seconds_sum{_labels(conversion=conversion)} {total['seconds']:.4f}")
+        lines.append(f"mivi_conversion_duration_seconds_count{_labels(conversion=conversion)} {total['count']}")
+    for key, help_text in (("input_bytes", "Input bytes converted."), ("output_bytes", "Output bytes written.")):
+        lines += [f"# HELP mivi_conversion_{key}_total {help_text}", f"# TYPE mivi_conversion_{key}_total counter"]
+        for conversion, total in totals:
+            lines.append(f"mivi_conversion_{key}_total{_labels(conversion=conversion)} {total[key]}")
+    lines += ["# HELP mivi_conversion_peak_rss_bytes Highest process RSS seen at the end of a conversion.",
+              "# TYPE mivi_conversion_peak_rss_bytes gauge"]
+    for conversion, total in totals:
+        lines.append(f"mivi_conversion_peak_rss_bytes{_labels(conversion=conversion)} {int(total['peak_rss_mb'] * 1024 * 1024)}")
+
+    copies = sorted(state.get("copies", {}).items())
+    for key, kind, help_text in (("copies", "copies_total", "Full copies made of conversion inputs and outputs."),
+                                 ("bytes", "copied_bytes_total", "Bytes moved by those copies.")):
+        lines += [f"# HELP mivi_conversion_{kind} {help_text}", f"# TYPE mivi_conversion_{kind} counter"]
+        for conversion, total in copies:
+            lines.append(f"mivi_conversion_{kind}{_labels(conversion=conversion)} {total[key]}")
+
+    stages = sorted(state.get("stages", {}).items())
+    for key, kind, help_text in (("seconds", "seconds_total", "Time spent per conversion stage."),
+                                 ("calls", "calls_total", "Times each conversion stage ran."),
+                                 ("bytes", "bytes_total", "Bytes processed per conversion stage.")):
+        lines += [f"# HELP mivi_stage_{kind} {help_text}", f"# TYPE mivi_stage_{kind} counter"]
+        for conversion, by_stage in stages:
+            for name, total in sorted(by_stage.items()):
+                value = f"{total[key]:.4f}" if key == "seconds" else total[key]
+                lines.append(f"mivi_stage_{kind}{_labels(conversion=conversion, stage=name)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _replace(path, text):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def emit(report, directory=None):
+    """Append ``report`` to the JSON log and update the Prometheus file. Never raises."""
+    if not METRICS_ENABLED:
+        return
+    directory = directory or DEFAULT_METRICS_DIR
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with _write_lock, open(os.path.join(directory, ".lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX) # CLI workers write from several processes
+            with open(os.path.join(directory, LOG_NAME), "a", encoding="utf-8") as log:
+                log.write(json.dumps(report, default=str, ensure_ascii=False) + "\n")
+            state_path = os.path.join(directory, STATE_NAME)
+            try:
+                with open(state_path, encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+            _fold(state, report)
+            _replace(state_path, json.dumps(state))
+            _replace(os.path.join(directory, PROM_NAME), render_prometheus(state))
+    except OSError:
+        pass # Metrics must never fail a conversion
+
+
+def emit_stage(conversion_type, name, seconds, nbytes=0, copies=0, **labels):
+    """Log and count a stage that runs outside the conversion (e.g. building the download)."""
+    entry = {"seconds": round(seconds, 4), "calls": 1, "bytes": nbytes, "rss_growth_mb": None}
+    emit({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "conversion": conversion_type,
+        "copies": copies,
+        "copied_bytes": nbytes if copies else 0,
+        "stages": {name: entry},
+        **labels,
+    })
+    return entry
@@ -0,0 +1,162 @@
+"""Text ➜ PDF layout engine.
+
+Lines are read from the input file one at a time and drawn as they arrive.
+Word wrapping is greedy over cached per-word widths, so each line costs time
+linear in its length instead of re-measuring the growing prefix for every
+word. Lines that Helvetica can't encode are drawn with the bundled
+DejaVuSans.ttf, so non-Latin text renders instead of showing black boxes.
+"""
+import os
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from telemetry import stage
+
+LATIN_FONT = "Helvetica"
+UNICODE_FONT = "DejaVuSans"
+UNICODE_FONT_PATH = os.environ.get(
+    "MIVI_UNICODE_FONT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "DejaVuSans.ttf")
+)
+TAB_SIZE = 4
+
+_unicode_font_ok = None
+
+
+def register_unicode_font():
+    """Register DejaVuSans with reportlab once; returns False if the TTF is missing or unreadable."""
+    global _unicode_font_ok
+    if _unicode_font_ok is None:
+        try:
+            pdfmetrics.registerFont(TTFont(UNICODE_FONT, UNICODE_FONT_PATH))
+            _unicode_font_ok = True
+        except Exception:
+            _unicode_font_ok = False
+    return _unicode_font_ok
+
+
+class WidthCache:
+    """Memoized string widths for one font and size."""
+
+    def __init__(self, font_name, font_size):
+        self.font_name = font_name
+        self.font_size = font_size
+        self.widths = {}
+        self.space = pdfmetrics.stringWidth(" ", font_name, font_size)
+
+    def __call__(self, text):
+        width = self.widths.get(text)
+        if width is None:
+            width = pdfmetrics.stringWidth(text, self.font_name, self.font_size)
+            if len(self.widths) < 200000: # Keep the cache bounded on huge vocabularies
+                self.widths[text] = width
+        return width
+
+
+def _split_long_word(word, measure, max_width):
+    """Hard-break a word wider than the line, one character at a time."""
+    piece, piece_width = "", 0.0
+    for char in word:
+        char_width = measure(char)
+        if piece and piece_width + char_width > max_width:
+            yield piece
+            piece, piece_width = "", 0.0
+        piece += char
+        piece_width += char_width
+    if piece:
+        yield piece
+
+
+def wrap_line(line, measure, max_width):
+    """Yield the pieces of ``line`` that fit within ``max_width`` points."""
+    # Whole lines are measured uncached; only individual words go in the cache
+    if pdfmetrics.stringWidth(line, measure.font_name, measure.font_size) <= max_width:
+        yield line
+        return
+
+    words = line.split()
+    if not words: # A run of spaces wider than the page
+        yield ""
+        return
+
+    current, current_width = [], 0.0
+    for word in words:
+        word_width = measure(word)
+        if word_width > max_width:
+            if current:
+                yield " ".join(current)
+                current, current_width = [], 0.0
+            pieces = list(_split_long_word(word, measure, max_width))
+            yield from pieces[:-1]
+            word = pieces[-1]
+            word_width = measure(word)
+        needed = word_width + (measure.space if current else 0.0)
+        if current and current_width + needed > max_width:
+            yield " ".join(current)
+            current, current_width = [word], word_width
+        else:
+            current.append(word)
+            current_width += needed
+    if current:
+        yield " ".join(current)
+
+
+def _font_for(line, unicode_available):
+    if line.isascii():
+        return LATIN_FONT
+    try:
+        line.encode("cp1252") # Helvetica's WinAnsi encoding
+        return LATIN_FONT
+    except UnicodeEncodeError:
+        return UNICODE_FONT if unicode_available else LATIN_FONT
+
+
+def render_text_pdf(input_path, output_path, font_size=10, leading=12, margin=40, pagesize=A4, progress=None):
+    """Lay out the UTF-8 text file ``input_path`` as a PDF; returns ``{"pages", "lines"}``.
+
+    ``progress(fraction)`` is called every few thousand lines.
+    """
+    unicode_available = register_unicode_font()
+    measures = {LATIN_FONT: WidthCache(LATIN_FONT, font_size)}
+    if unicode_available:
+        measures[UNICODE_FONT] = WidthCache(UNICODE_FONT, font_size)
+
+    width, height = pagesize
+    max_width = width - 2 * margin
+    lines_per_page = int((height - 2 * margin) // leading)
+    total_chars = max(os.path.getsize(input_path), 1)
+
+    # pageCompression keeps the finished pages small while the document is open
+    c = canvas.Canvas(output_path, pagesize=pagesize, pageCompression=1)
+    pages, drawn, line_count, chars_read = 1, 0, 0, 0
+    text_object = c.beginText(margin, height - margin)
+    font = None
+
+    with open(input_path, encoding="utf-8", errors="replace") as f, stage("layout"):
+        for n, raw_line in enumerate(f, 1):
+            chars_read += len(raw_line)
+            line = raw_line.rstrip("\r\n").expandtabs(TAB_SIZE)
+            line_font = _font_for(line, unicode_available)
+            if line_font != font:
+                font = line_font
+                text_object.setFont(font, font_size, leading)
+            for piece in wrap_line(line, measures[font], max_width):
+                if line_count >= lines_per_page:
+                    c.drawText(text_object)
+                    c.showPage()
+                    pages += 1
+                    text_object = c.beginText(margin, height - margin)
+                    text_object.setFont(font, font_size, leading)
+                    line_count = 0
+                text_object.textLine(piece)
+                line_count += 1
+                drawn += 1
+            if progress and n % 5000 == 0:
+                progress(min(chars_read / total_chars, 1.0))
+
+    c.drawText(text_object) # Draw remaining text
+    with stage("encode"):
+        c.save()
+    return {"pages": pages, "lines": drawn}